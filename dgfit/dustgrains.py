@@ -1,14 +1,34 @@
-import glob
+import fnmatch
+import functools
+import os
 import re
 import math
 
 import numpy as np
 from astropy.table import Table
 
-from scipy.interpolate import interp1d
-
 __all__ = ["DustGrains"]
 
+# names of the dust grain components with precomputed files
+allowed_components = frozenset(
+    [
+        "astro-silicates",
+        "astro-carbonaceous",
+        "astro-graphite",
+        "PAH-Z04",
+        "Graphite-Z04",
+        "Silicates-Z04",
+        "ACH2-Z04",
+        "Silicates1-Z04",
+        "Silicates2-Z04",
+        "Carbonaceous-HD23",
+        "AstroDust-HD23",
+        "a-C-Themis",
+        "a-C:H-Themis",
+        "aSil-2-Themis",
+    ]
+)
+
 
 # Object for the proprerties of dust grain with a specific composition
 class DustGrains(object):
@@ -21,6 +41,23 @@ class DustGrains(object):
     ----------
     origin : 'string'
 
+    emission_cache : tuple
+        (ISRF strength, emission) of the last interpol_emission call
+
+    weights_cache : tuple
+        (size distribution bytes, integration weights) of the last
+        eff_grain_props call
+
+    size_dist_shared : boolean
+        True if size_dist is a view into the size distributions of a
+        DustModel, assigning to size_dist then sets the values in place
+
+    Notes
+    -----
+    emission_cache, weights_cache and the grain property products of
+    natoms_basis and g_csca are only reset by from_files and from_object.
+    The grain property arrays are not expected to change in place.
+
     """
 
     def __init__(self):
@@ -28,6 +65,42 @@ class DustGrains(object):
         Simple initialization allowing for multiple origins of data
         """
         self.origin = None
+        self.emission_cache = (None, None)
+        self.weights_cache = (None, None)
+        self._natoms_basis = None
+        self._g_csca = None
+        self._size_dist = None
+        self.size_dist_shared = False
+
+    @property
+    def size_dist(self):
+        """
+        Size distribution on the grain sizes.
+        """
+        return self._size_dist
+
+    @size_dist.setter
+    def size_dist(self, values):
+        # keep the view into the size distributions of the DustModel
+        if self.size_dist_shared:
+            self._size_dist[:] = values
+        else:
+            self._size_dist = values
+
+    def share_size_dist(self, buffer):
+        """
+        Use an array shared with other objects for the size distribution
+        (e.g., a slice of the size distributions of all the components of
+        a DustModel).  Assigning to size_dist afterwards sets the values of
+        this array in place.
+
+        Parameters
+        ----------
+        buffer : 'numpy.ndarray'
+            array for the size distribution, with n_sizes elements
+        """
+        self._size_dist = buffer
+        self.size_dist_shared = True
 
     def from_files(self, componentname, path="./", every_nth=5):
         """
@@ -45,35 +118,18 @@ class DustGrains(object):
         """
 
         self.origin = "files"
-
-        # min/max wavelengths for storage
-        #    set here in case later we want to pass them via the function call
-        min_wave = 0.0
-        max_wave = (1e6,)
-        min_wave_emission = 0.0
-        max_wave_emission = 1e6
+        self.emission_cache = (None, None)
+        self.weights_cache = (None, None)
+        self._natoms_basis = None
+        self._g_csca = None
 
         # check that the component name is allowed
-        _allowed_components = [
-            "astro-silicates",
-            "astro-carbonaceous",
-            "astro-graphite",
-            "PAH-Z04",
-            "Graphite-Z04",
-            "Silicates-Z04",
-            "ACH2-Z04",
-            "Silicates1-Z04",
-            "Silicates2-Z04",
-            "Carbonaceous-HD23",
-            "AstroDust-HD23",
-            "a-C-Themis",
-            "a-C:H-Themis",
-            "aSil-2-Themis",
-        ]
-        if componentname not in _allowed_components:
-            print(componentname + " not one of the allowed grain components")
-            print(_allowed_components)
-            exit()
+        if componentname not in allowed_components:
+            raise ValueError(
+                componentname
+                + " not one of the allowed grain components "
+                + str(sorted(allowed_components))
+            )
 
         # set useful quantities for each composition
         if componentname in [
@@ -161,125 +217,30 @@ class DustGrains(object):
             * (self.atomic_comp_number / self.mass_per_mol_comp)
         )
 
-        # get the filenames of this component for all sizes
-        filelist = []
-        for file in glob.glob(
-            path + "INDIV-GRAINS-DGFIT_c_*" + componentname + "*.dat"
-        ):
-            m = re.search("_s_(.+?).dat", file)
-            if m:
-                found = m.group(1)
-                sizenum = found
-
-                # get the grain size
-                f = open(file, "r")
-                firstline = f.readline()
-                space_pos = firstline.find(" ", 5)
-                f.close()
-
-                filelist.append(
-                    (
-                        file,
-                        int(sizenum),
-                        float(firstline[1:space_pos]),
-                    )
-                )
-
-        # check if any files were found
-        if len(filelist) == 0:
-            print("no files found")
-            print("path = " + path)
-            exit()
-
-        # code to just pick every nth grain size
-        # makes the fitting faster, but the size distributions coarser
-        tindxs = np.arange(0, len(filelist), every_nth)
-        sfilelist = sorted(filelist, key=lambda file: file[1])
-        filelist = []
-        for k in tindxs:
-            filelist.append(sfilelist[k])
+        # read the tables for all the sizes (cached)
+        #   copied as the cached arrays are shared and read-only
+        tables = load_grain_tables(componentname, path, every_nth)
 
         # setup the variables to store the grain information
         self.name = componentname
-        self.n_sizes = len(filelist)
-        self.sizes = np.empty(self.n_sizes)
-        self.size_dist = np.empty(self.n_sizes)
-        self.stochastic_heating = np.empty(self.n_sizes)
+        self.n_sizes = len(tables["sizes"])
+        self.sizes = tables["sizes"].copy()
+        self.size_dist = tables["size_dist"].copy()
+        self.stochastic_heating = tables["stochastic_heating"].copy()
         self.RF_strength = 1
 
-        # loop over the files from the smallest to the largest sizes
-        for k, file in enumerate(sorted(filelist, key=lambda file: file[1])):
-            # read in the table of grain properties for this size
-            t = Table.read(file[0], format="ascii.commented_header", header_start=-1)
-
-            stochheated = False
-            for tcomment in t.meta["comments"]:
-                if "StochasticallyHeated" in tcomment:
-                    if "1" in tcomment:
-                        stochheated = True
-
-            # setup more variables now that we know the number of wavelengths
-            if k == 0:
-                # generate the indices to crop the wavelength to the
-                #      desired range
-                (gindxs,) = np.where(
-                    (t["Wavelength"] >= min_wave) & (t["Wavelength"] <= max_wave)
-                )
-                (egindxs,) = np.where(
-                    (t["Wavelength"] >= min_wave_emission)
-                    & (t["Wavelength"] <= max_wave_emission)
-                )
-                self.wavelengths = np.array(t["Wavelength"][gindxs])
-                self.wavelengths_emission = np.array(t["Wavelength"][egindxs])
-                self.n_wavelengths = len(self.wavelengths)
-                self.n_wavelengths_emission = len(self.wavelengths_emission)
-                self.cext = np.empty((self.n_sizes, self.n_wavelengths))
-                self.cabs = np.empty((self.n_sizes, self.n_wavelengths))
-                self.csca = np.empty((self.n_sizes, self.n_wavelengths))
-                self.scat_g = np.empty((self.n_sizes, self.n_wavelengths))
-
-                self.ISRF_field_strengths = []
-                for tcomment in t.meta["comments"]:
-                    if "Scales" in tcomment:
-                        scales = tcomment.split(":")[1].strip()
-                        for number in scales.split():
-                            self.ISRF_field_strengths.append(float(number))
-
-                self.n_ISRF_strengths = len(self.ISRF_field_strengths)
-                self.emission = np.empty(
-                    (self.n_ISRF_strengths, self.n_sizes, self.n_wavelengths_emission)
-                )
-
-            # store the info
-            self.sizes[k] = file[2]
-            self.stochastic_heating[k] = stochheated
-            self.cext[k, :] = t["CExt"][gindxs]
-            self.csca[k, :] = t["CSca"][gindxs]
-            self.cabs[k, :] = t["CAbs"][gindxs]
-            self.scat_g[k, :] = t["G"][gindxs]
-            if self.stochastic_heating[k]:
-                base = "StEm"
-                for i in range(self.n_ISRF_strengths):
-                    number = str(i + 1)
-                    self.emission[i, k, :] = t[base + number][egindxs]
-
-            else:
-                base = "EqEm"
-                for i in range(self.n_ISRF_strengths):
-                    number = str(i + 1)
-                    self.emission[i, k, :] = t[base + number][egindxs]
-
-            # convert emission from ergs/(s cm sr) to Jy/sr
-            #   wavelengths in microns
-            #      convert from cm^-1 to Hz^-1
-            self.emission[:, k, :] *= (self.wavelengths_emission) ** 2 / 2.998e10
-            self.emission[:, k, :] /= 1e-19  # convert from ergs/(s Hz) to Jy
-            self.emission[:, k, :] *= 1e-6  # convert from Jy/sr to MJy/sr
-            # convert from m^-2 to cm^-2
-            self.emission[:, k, :] *= 1e-4
-
-            # default size distributions
-            self.size_dist[k] = self.sizes[k] ** (-4.0)
+        self.wavelengths = tables["wavelengths"].copy()
+        self.wavelengths_emission = tables["wavelengths_emission"].copy()
+        self.n_wavelengths = len(self.wavelengths)
+        self.n_wavelengths_emission = len(self.wavelengths_emission)
+        self.cext = tables["cext"].copy()
+        self.cabs = tables["cabs"].copy()
+        self.csca = tables["csca"].copy()
+        self.scat_g = tables["scat_g"].copy()
+
+        self.ISRF_field_strengths = np.array(tables["ISRF_field_strengths"])
+        self.n_ISRF_strengths = len(self.ISRF_field_strengths)
+        self.emission = tables["emission"].copy()
 
         # aliases for albedo and g calculations
         #    here they are on the same wavelength grid
@@ -313,6 +274,10 @@ class DustGrains(object):
            contains all the observed data to be fit
         """
         self.origin = "object"
+        self.emission_cache = (None, None)
+        self.weights_cache = (None, None)
+        self._natoms_basis = None
+        self._g_csca = None
 
         # copy the basic information on the grain
         self.density = DustGrain.density
@@ -336,47 +301,37 @@ class DustGrains(object):
         self.wavelengths = ObsData.ext_waves
         self.n_wavelengths = len(self.wavelengths)
 
-        # variables to store the dust grain properties
-        self.cext = np.empty((self.n_sizes, self.n_wavelengths))
-        self.cabs = np.empty((self.n_sizes, self.n_wavelengths))
-        self.csca = np.empty((self.n_sizes, self.n_wavelengths))
-
         self.wavelengths_emission = ObsData.ir_emission_waves
         self.n_wavelengths_emission = len(self.wavelengths_emission)
-        self.emission = np.empty(
-            (self.n_ISRF_strengths, self.n_sizes, self.n_wavelengths_emission)
-        )
 
         self.wavelengths_scat_a = ObsData.scat_a_waves
         self.n_wavelengths_scat_a = len(self.wavelengths_scat_a)
-        self.scat_a_cext = np.empty((self.n_sizes, self.n_wavelengths_scat_a))
-        self.scat_a_csca = np.empty((self.n_sizes, self.n_wavelengths_scat_a))
 
         self.wavelengths_scat_g = ObsData.scat_g_waves
         self.n_wavelengths_scat_g = len(self.wavelengths_scat_g)
-        self.scat_g = np.empty((self.n_sizes, self.n_wavelengths_scat_g))
-        self.scat_g_csca = np.empty((self.n_sizes, self.n_wavelengths_scat_g))
-
-        # loop over the sizes and generate grain info on the observed data grid
-        for i in range(self.n_sizes):
-            cext_interp = interp1d(DustGrain.wavelengths, DustGrain.cext[i, :])
-            cabs_interp = interp1d(DustGrain.wavelengths, DustGrain.cabs[i, :])
-            csca_interp = interp1d(DustGrain.wavelengths, DustGrain.csca[i, :])
-            self.cext[i, :] = cext_interp(self.wavelengths)
-            self.cabs[i, :] = cabs_interp(self.wavelengths)
-            self.csca[i, :] = csca_interp(self.wavelengths)
-
-            self.scat_a_cext[i, :] = cext_interp(self.wavelengths_scat_a)
-            self.scat_a_csca[i, :] = csca_interp(self.wavelengths_scat_a)
-
-            g_interp = interp1d(DustGrain.wavelengths, DustGrain.scat_g[i, :])
-            self.scat_g[i, :] = g_interp(self.wavelengths_scat_g)
-            self.scat_g_csca[i, :] = csca_interp(self.wavelengths_scat_g)
-
-            emission_interp = interp1d(
-                DustGrain.wavelengths_emission, DustGrain.emission[:, i, :]
-            )
-            self.emission[:, i, :] = emission_interp(self.wavelengths_emission)
+
+        # generate grain info on the observed data grids
+        #   interpolating all the sizes at once along the wavelength axis
+        #   the interpolation weights are computed once for each grid
+        #   and shared by all the properties on that grid
+        waves = DustGrain.wavelengths
+        ext_weights = interp_weights(self.wavelengths, waves)
+        self.cext = linear_interp(DustGrain.cext, ext_weights)
+        self.cabs = linear_interp(DustGrain.cabs, ext_weights)
+        self.csca = linear_interp(DustGrain.csca, ext_weights)
+
+        scat_a_weights = interp_weights(self.wavelengths_scat_a, waves)
+        self.scat_a_cext = linear_interp(DustGrain.cext, scat_a_weights)
+        self.scat_a_csca = linear_interp(DustGrain.csca, scat_a_weights)
+
+        scat_g_weights = interp_weights(self.wavelengths_scat_g, waves)
+        self.scat_g = linear_interp(DustGrain.scat_g, scat_g_weights)
+        self.scat_g_csca = linear_interp(DustGrain.csca, scat_g_weights)
+
+        emission_weights = interp_weights(
+            self.wavelengths_emission, DustGrain.wavelengths_emission
+        )
+        self.emission = linear_interp(DustGrain.emission, emission_weights)
 
     # function to integrate this component
     # returns the effective/total cabs, csca, etc.
@@ -399,6 +354,9 @@ class DustGrains(object):
         Abundances : ('list', 'numpy.ndarray') named 'natoms'
            Tuple with (atomic elements, # per/10^6 H atoms
 
+        Abundances : 'numpy.ndarray' named 'natoms_arr'
+           # of atoms in the same order as atomic_comp_names
+
         Emission : 'numpy.ndarray' named 'emission'
            IR emission
 
@@ -424,292 +382,275 @@ class DustGrains(object):
         # output is a dictonary
         results = {}
 
-        # initialize the results
-        _effcabs = np.empty(self.n_wavelengths)
-        _effcsca = np.empty(self.n_wavelengths)
-
         # do a very simple integration (later this could be made more complex)
-        deltas = 0.5 * (self.sizes[1 : self.n_sizes] - self.sizes[0 : self.n_sizes - 1])
-        sizedist1 = self.size_dist[0 : self.n_sizes - 1]
-        sizedist2 = self.size_dist[1 : self.n_sizes]
-        for i in range(self.n_wavelengths):
-            _effcabs[i] = np.sum(
-                deltas
-                * (
-                    (self.cabs[0 : self.n_sizes - 1, i] * sizedist1)
-                    + (self.cabs[1 : self.n_sizes, i] * sizedist2)
-                )
-            )
-            _effcsca[i] = np.sum(
-                deltas
-                * (
-                    (self.csca[0 : self.n_sizes - 1, i] * sizedist1)
-                    + (self.csca[1 : self.n_sizes, i] * sizedist2)
-                )
-            )
-
-            # *not* faster to use numexpr (tested in 2015)
-
-        results["cabs"] = _effcabs
-        results["csca"] = _effcsca
+        #   done for all the wavelengths at once as weights @ property
+        #   the weights only depend on the size distribution
+        #   so are reused if it has not changed since the last call
+        size_dist_key = self.size_dist.tobytes()
+        if self.weights_cache[0] == size_dist_key:
+            weights = self.weights_cache[1]
+        else:
+            weights = self.integration_weights(self.size_dist)
+            self.weights_cache = (size_dist_key, weights)
+
+        results["cabs"] = weights @ self.cabs
+        results["csca"] = weights @ self.csca
 
         # compute the number of atoms/A(V)
-        _natoms = np.empty(len(self.atomic_comp_names))
-        for i in range(len(self.atomic_comp_names)):
-            if self.name in [
-                "a-C:H-Themis",
-                "aSil-2-Themis",
-            ]:  # correct for the mantles of Themis
-                if self.name == "a-C:H-Themis":
-                    mantle = 5 * 1e-7
-                    indices = np.where(self.sizes <= mantle)[0]
-                    best_index = indices[np.argmax(self.sizes[indices])] + 1
-                    _natoms[i] = np.sum(
-                        deltas[: best_index - 1]
-                        * (
-                            (
-                                (self.sizes[0 : best_index - 1] ** 3)
-                                * self.size_dist[0 : best_index - 1]
-                                * self.col_den_constant[i]
-                                * 1.6
-                                / 1.3  # correcting for the densities
-                            )
-                            + (
-                                (self.sizes[1:best_index] ** 3)
-                                * self.size_dist[1:best_index]
-                                * self.col_den_constant[i]
-                                * 1.6
-                                / 1.3
-                            )
-                        )
-                    )
-                    _natoms[i] += np.sum(
-                        deltas[best_index:]
-                        * (
-                            (
-                                (
-                                    (self.sizes[best_index : self.n_sizes - 1] ** 3)
-                                    - (
-                                        (
-                                            self.sizes[best_index : self.n_sizes - 1]
-                                            - mantle
-                                        )
-                                        ** 3
-                                    )
-                                )
-                                * self.size_dist[best_index : self.n_sizes - 1]
-                                * self.col_den_constant[i]
-                                * 1.6
-                                / 1.3
-                            )
-                            + (
-                                (
-                                    (self.sizes[best_index + 1 : self.n_sizes] ** 3)
-                                    - (
-                                        (
-                                            self.sizes[best_index + 1 : self.n_sizes]
-                                            - mantle
-                                        )
-                                        ** 3
-                                    )
-                                )
-                                * self.size_dist[best_index + 1 : self.n_sizes]
-                                * self.col_den_constant[i]
-                                * 1.6
-                                / 1.3
-                            )
-                        )
-                    )
-                    _natoms[i] += np.sum(
-                        deltas[best_index:]
-                        * (
-                            (
-                                (
-                                    (self.sizes[best_index : self.n_sizes - 1] - mantle)
-                                    ** 3
-                                )
-                                * self.size_dist[best_index : self.n_sizes - 1]
-                                * self.col_den_constant[i]
-                            )
-                            + (
-                                (
-                                    (self.sizes[best_index + 1 : self.n_sizes] - mantle)
-                                    ** 3
-                                )
-                                * self.size_dist[best_index + 1 : self.n_sizes]
-                                * self.col_den_constant[i]
-                            )
-                        )
-                    )
-
-                else:
-                    mantle = 2.5 * 1e-7
-                    if i == 3:
-                        _natoms[i] = np.sum(
-                            deltas
-                            * (
-                                (
-                                    (
-                                        (self.sizes[0 : self.n_sizes - 1] ** 3)
-                                        - (
-                                            (self.sizes[0 : self.n_sizes - 1] - mantle)
-                                            ** 3
-                                        )
-                                    )
-                                    * self.size_dist[0 : self.n_sizes - 1]
-                                    * self.col_den_constant[i]
-                                    * 1.6
-                                    / 2.7  # correcting for the densities
-                                )
-                                + (
-                                    (
-                                        (self.sizes[1 : self.n_sizes] ** 3)
-                                        - ((self.sizes[1 : self.n_sizes] - mantle) ** 3)
-                                    )
-                                    * self.size_dist[1 : self.n_sizes]
-                                    * self.col_den_constant[i]
-                                    * 1.6
-                                    / 2.7
-                                )
-                            )
-                        )
-
-                    else:
-                        _natoms[i] = np.sum(
-                            deltas
-                            * (
-                                (
-                                    ((self.sizes[0 : self.n_sizes - 1] - mantle) ** 3)
-                                    * self.size_dist[0 : self.n_sizes - 1]
-                                    * self.col_den_constant[i]
-                                )
-                                + (
-                                    ((self.sizes[1 : self.n_sizes] - mantle) ** 3)
-                                    * self.size_dist[1 : self.n_sizes]
-                                    * self.col_den_constant[i]
-                                )
-                            )
-                        )
-
-            else:
-                _natoms[i] = np.sum(
-                    deltas
-                    * (
-                        (
-                            (self.sizes[0 : self.n_sizes - 1] ** 3)
-                            * self.size_dist[0 : self.n_sizes - 1]
-                            * self.col_den_constant[i]
-                        )
-                        + (
-                            (self.sizes[1 : self.n_sizes] ** 3)
-                            * self.size_dist[1 : self.n_sizes]
-                            * self.col_den_constant[i]
-                        )
-                    )
-                )
-
+        _natoms = self.compute_natoms(self.size_dist)
         results["natoms"] = dict(zip(self.atomic_comp_names, _natoms))
+        results["natoms_arr"] = _natoms
 
         # compute the integrated emission spectrum for the right ISRF strength
         if ObsData.fit_ir_emission or predict_all:
-            _emission = np.empty(self.n_wavelengths_emission)
-
             # Calculate the emission for the used radaiation field
             interpolated_emission = self.interpol_emission(self.RF_strength)
-
-            for i in range(self.n_wavelengths_emission):
-                _emission[i] = np.sum(
-                    deltas
-                    * (
-                        (interpolated_emission[0 : self.n_sizes - 1, i] * sizedist1)
-                        + (interpolated_emission[1 : self.n_sizes, i] * sizedist2)
-                    )
-                )
-            results["emission"] = _emission
+            results["emission"] = weights @ interpolated_emission
 
         # scattering parameters a & g
         if ObsData.fit_scat_a or predict_all:
-            n_waves_scat_a = self.n_wavelengths_scat_a
-            scat_a_cext = self.scat_a_cext
-            scat_a_csca = self.scat_a_csca
-
-            _effscat_a_cext = np.empty(n_waves_scat_a)
-            _effscat_a_csca = np.empty(n_waves_scat_a)
-
-            for i in range(n_waves_scat_a):
-                _effscat_a_cext[i] = np.sum(
-                    deltas
-                    * (
-                        (scat_a_cext[0 : self.n_sizes - 1, i] * sizedist1)
-                        + (scat_a_cext[1 : self.n_sizes, i] * sizedist2)
-                    )
-                )
-                _effscat_a_csca[i] = np.sum(
-                    deltas
-                    * (
-                        (scat_a_csca[0 : self.n_sizes - 1, i] * sizedist1)
-                        + (scat_a_csca[1 : self.n_sizes, i] * sizedist2)
-                    )
-                )
-
-            a = []
-            for i, value in enumerate(_effscat_a_cext):
-                if value == 0:
-                    a.append(0)
-                else:
-                    a.append(_effscat_a_csca[i] / value)
-
-            results["albedo"] = np.array(a)
+            _effscat_a_cext = weights @ self.scat_a_cext
+            _effscat_a_csca = weights @ self.scat_a_csca
+
+            # zero albedo where there is no extinction
+            results["albedo"] = np.divide(
+                _effscat_a_csca,
+                _effscat_a_cext,
+                out=np.zeros(self.n_wavelengths_scat_a),
+                where=_effscat_a_cext != 0,
+            )
             results["scat_a_cext"] = _effscat_a_cext
             results["scat_a_csca"] = _effscat_a_csca
 
         if ObsData.fit_scat_g or predict_all:
-            n_waves_scat_g = self.n_wavelengths_scat_g
-            scat_g_csca = self.scat_g_csca
-
-            _effg = np.empty(n_waves_scat_g)
-            _effscat_g_csca = np.empty(n_waves_scat_g)
-
-            for i in range(n_waves_scat_g):
-                _effg[i] = np.sum(
-                    deltas
-                    * (
-                        (
-                            self.scat_g[0 : self.n_sizes - 1, i]
-                            * scat_g_csca[0 : self.n_sizes - 1, i]
-                            * sizedist1
-                        )
-                        + (
-                            self.scat_g[1 : self.n_sizes, i]
-                            * scat_g_csca[1 : self.n_sizes, i]
-                            * sizedist2
-                        )
-                    )
-                )
-                _effscat_g_csca[i] = np.sum(
-                    deltas
-                    * (
-                        (scat_g_csca[0 : self.n_sizes - 1, i] * sizedist1)
-                        + (scat_g_csca[1 : self.n_sizes, i] * sizedist2)
-                    )
-                )
-
-            g = []
-            for i, value in enumerate(_effscat_g_csca):
-                if value == 0:
-                    g.append(0)
-                else:
-                    g.append(_effg[i] / value)
-
-            results["g"] = np.array(g)
+            _effg = weights @ self.g_csca()
+            _effscat_g_csca = weights @ self.scat_g_csca
+
+            # zero g where there is no scattering
+            results["g"] = np.divide(
+                _effg,
+                _effscat_g_csca,
+                out=np.zeros(self.n_wavelengths_scat_g),
+                where=_effscat_g_csca != 0,
+            )
             results["scat_g_csca"] = _effscat_g_csca
 
         # return the results as a tuple of arrays
         return results
 
+    def integration_weights(self, size_dists):
+        """
+        Weights for the integration over the grain sizes such that the
+        integral of a grain property is ``weights @ property``.
+        Uses the same very simple integration as eff_grain_props.
+
+        Parameters
+        ----------
+        size_dists : 'numpy.ndarray'
+            size distributions with shape (n_sizes) or (n_batch, n_sizes)
+
+        Returns
+        -------
+        'numpy.ndarray'
+            weights with the same shape as size_dists
+        """
+        size_dists = np.asarray(size_dists)
+        deltas = 0.5 * (self.sizes[1 : self.n_sizes] - self.sizes[0 : self.n_sizes - 1])
+        weights = np.zeros(size_dists.shape)
+        weights[..., 0 : self.n_sizes - 1] += (
+            deltas * size_dists[..., 0 : self.n_sizes - 1]
+        )
+        weights[..., 1 : self.n_sizes] += deltas * size_dists[..., 1 : self.n_sizes]
+        return weights
+
+    def eff_grain_props_batch(
+        self, ObsData, size_dists, RF_strengths, predict_all=False
+    ):
+        """
+        Calculate the grain properties integrated over a batch of size
+        distributions for a single grain composition.  All the integrated
+        properties are linear in the size distribution, so the whole batch
+        is done with one matrix multiplication per property.
+
+        Parameters
+        ----------
+        ObsData : ObsData object
+            Observed data object specifically used to determine which
+            observations to compute (only those needed for speed)
+        size_dists : 'numpy.ndarray'
+            size distributions with shape (n_batch, n_sizes)
+        RF_strengths : 'numpy.ndarray'
+            radiation field strength for each size distribution
+        predict_all : boolean
+            Regardless of the ObsData, compute all possible observations
+
+        Returns
+        -------
+        A dictionary with the same keys as eff_grain_props, each value
+        having an extra leading dimension of n_batch.
+        """
+        results = {}
+
+        weights = self.integration_weights(size_dists)
+
+        results["cabs"] = weights @ self.cabs
+        results["csca"] = weights @ self.csca
+
+        # number of atoms/A(V)
+        _natoms = size_dists @ self.natoms_basis().T
+        results["natoms"] = dict(zip(self.atomic_comp_names, _natoms.T))
+        results["natoms_arr"] = _natoms
+
+        if ObsData.fit_ir_emission or predict_all:
+            results["emission"] = self.eff_emission_batch(weights, RF_strengths)
+
+        # scattering parameters a & g
+        if ObsData.fit_scat_a or predict_all:
+            _effscat_a_cext = weights @ self.scat_a_cext
+            _effscat_a_csca = weights @ self.scat_a_csca
+            results["albedo"] = np.divide(
+                _effscat_a_csca,
+                _effscat_a_cext,
+                out=np.zeros(_effscat_a_cext.shape),
+                where=_effscat_a_cext != 0,
+            )
+            results["scat_a_cext"] = _effscat_a_cext
+            results["scat_a_csca"] = _effscat_a_csca
+
+        if ObsData.fit_scat_g or predict_all:
+            _effg = weights @ self.g_csca()
+            _effscat_g_csca = weights @ self.scat_g_csca
+            results["g"] = np.divide(
+                _effg,
+                _effscat_g_csca,
+                out=np.zeros(_effscat_g_csca.shape),
+                where=_effscat_g_csca != 0,
+            )
+            results["scat_g_csca"] = _effscat_g_csca
+
+        return results
+
+    def eff_emission_batch(self, weights, RF_strengths):
+        """
+        Emission integrated over a batch of size distributions, linearly
+        interpolated between the two bracketing ISRF strengths.
+
+        Parameters
+        ----------
+        weights : 'numpy.ndarray'
+            integration weights with shape (n_batch, n_sizes),
+            see integration_weights
+        RF_strengths : 'numpy.ndarray'
+            radiation field strength for each size distribution
+
+        Returns
+        -------
+        'numpy.ndarray'
+            emission with shape (n_batch, n_wavelengths_emission)
+        """
+        x = self.ISRF_field_strengths
+        RF = np.clip(RF_strengths, x[0], x[-1])
+        j = np.clip(np.searchsorted(x, RF, side="right") - 1, 0, len(x) - 2)
+        frac = ((RF - x[j]) / (x[j + 1] - x[j]))[:, np.newaxis]
+        _emission_isrf = np.einsum("bs,isw->biw", weights, self.emission)
+        batch = np.arange(len(RF))
+        return (1.0 - frac) * _emission_isrf[batch, j] + (
+            frac * _emission_isrf[batch, j + 1]
+        )
+
+    def g_csca(self):
+        """
+        Product of the scattering g and C(sca) on the g wavelength grid,
+        the integrand of the g numerator.  Only depends on the grain
+        properties, so computed once.
+
+        Returns
+        -------
+        'numpy.ndarray'
+            scat_g * scat_g_csca with shape (n_sizes, n_wavelengths_scat_g)
+        """
+        if self._g_csca is None:
+            self._g_csca = self.scat_g * self.scat_g_csca
+        return self._g_csca
+
+    def natoms_basis(self):
+        """
+        Number of atoms/A(V) contributed by each grain size for a unit
+        size distribution value.  The number of atoms is linear in the
+        size distribution, so natoms = natoms_basis() @ size_dist.
+
+        Returns
+        -------
+        'numpy.ndarray'
+            basis with shape (n_atomic_comps, n_sizes)
+        """
+        if self._natoms_basis is None:
+            self._natoms_basis = np.array(
+                [self.compute_natoms(unit) for unit in np.identity(self.n_sizes)]
+            ).T
+        return self._natoms_basis
+
+    def compute_natoms(self, size_dist):
+        """
+        Compute the number of atoms/A(V) for each atomic component
+        integrated over the input size distribution.
+
+        Parameters
+        ----------
+        size_dist : 'numpy.ndarray'
+            size distribution on the grain sizes of this component
+
+        Returns
+        -------
+        'numpy.ndarray'
+            number of atoms/A(V) in the order of atomic_comp_names
+        """
+        deltas = 0.5 * (self.sizes[1 : self.n_sizes] - self.sizes[0 : self.n_sizes - 1])
+
+        # correct for the mantles of Themis
+        #   the volumes per grain size are computed once for all the atoms
+        if self.name == "a-C:H-Themis":
+            mantle = 5 * 1e-7
+            indices = np.where(self.sizes <= mantle)[0]
+            best_index = indices[np.argmax(self.sizes[indices])] + 1
+            sizes3 = self.sizes**3
+            core3 = (self.sizes - mantle) ** 3
+            # correcting for the densities of the grains thinner than the mantle
+            #   and of the mantles of the larger grains
+            vols = np.where(
+                np.arange(self.n_sizes) < best_index,
+                sizes3 * 1.6 / 1.3,
+                (sizes3 - core3) * 1.6 / 1.3 + core3,
+            )
+            # the interval between the two regimes is not included
+            deltas[best_index - 1] = 0.0
+            _natoms = self.col_den_constant * np.sum(
+                deltas * (vols[:-1] * size_dist[:-1] + vols[1:] * size_dist[1:])
+            )
+
+        elif self.name == "aSil-2-Themis":
+            mantle = 2.5 * 1e-7
+            core3 = (self.sizes - mantle) ** 3
+            vols = np.tile(core3, (len(self.atomic_comp_names), 1))
+            # carbon is in the mantles, correcting for the densities
+            vols[3] = (self.sizes**3 - core3) * 1.6 / 2.7
+            _natoms = self.col_den_constant * np.sum(
+                deltas * (vols[:, :-1] * size_dist[:-1] + vols[:, 1:] * size_dist[1:]),
+                axis=1,
+            )
+
+        else:
+            # same integral for all the atoms, only the constant differs
+            vols = self.sizes**3
+            _natoms = self.col_den_constant * np.sum(
+                deltas * (vols[:-1] * size_dist[:-1] + vols[1:] * size_dist[1:])
+            )
+
+        return _natoms
+
     def interpol_emission(self, ISRF):
 
-        x = np.array(self.ISRF_field_strengths)
+        x = self.ISRF_field_strengths
         if ISRF < x[0]:
             ISRF = x[0]
             self.RF_strength = x[0]
@@ -718,7 +659,372 @@ class DustGrains(object):
             ISRF = x[-1]
             self.RF_strength = x[-1]
 
-        interpolation = interp1d(x, self.emission, axis=0)
-        emission = interpolation(ISRF)
+        # reuse the last result if the ISRF strength has not changed
+        #   (shared with the cache so should not be modified)
+        if self.emission_cache[0] == ISRF:
+            return self.emission_cache[1]
+
+        # linear blend of the two bracketing ISRF strengths
+        j = min(max(np.searchsorted(x, ISRF, side="right") - 1, 0), len(x) - 2)
+        frac = (ISRF - x[j]) / (x[j + 1] - x[j])
+        emission = (1.0 - frac) * self.emission[j] + frac * self.emission[j + 1]
+        self.emission_cache = (ISRF, emission)
 
         return emission
+
+
+def interp_weights(x, xp):
+    """
+    Indices and weights for the linear interpolation from xp to x.
+    Computed once and used with linear_interp for all the arrays
+    on the same grids.
+
+    Parameters
+    ----------
+    x : 'numpy.ndarray'
+        values to interpolate to, must be in the range of xp
+    xp : 'numpy.ndarray'
+        increasing values to interpolate from
+
+    Returns
+    -------
+    tuple of 'numpy.ndarray'
+        (lower indices, upper indices, fractional distances) into xp
+
+    Raises
+    ------
+    ValueError
+        if any of x is outside the range of xp
+    """
+    x = np.asarray(x)
+    if np.any(x < xp[0]) or np.any(x > xp[-1]):
+        raise ValueError("A value in x is outside the interpolation range.")
+
+    hi = np.clip(np.searchsorted(xp, x), 1, len(xp) - 1)
+    lo = hi - 1
+    frac = (x - xp[lo]) / (xp[hi] - xp[lo])
+    return (lo, hi, frac)
+
+
+def linear_interp(fp, weights):
+    """
+    Linear interpolation along the last axis of an array
+    (e.g., all the grain sizes at once along the wavelengths).
+
+    Parameters
+    ----------
+    fp : 'numpy.ndarray'
+        values to interpolate
+    weights : tuple of 'numpy.ndarray'
+        interpolation indices and weights from interp_weights
+
+    Returns
+    -------
+    'numpy.ndarray'
+        interpolated values with shape fp.shape[:-1] + x.shape
+    """
+    lo, hi, frac = weights
+    return fp[..., lo] + frac * (fp[..., hi] - fp[..., lo])
+
+
+@functools.lru_cache(maxsize=16)
+def load_grain_tables(componentname, path, every_nth):
+    """
+    Load the precomputed dust grain information for all the sizes of a
+    component.  Uses the binary cache made by build_grain_cache if it exists
+    and is not older than the ASCII files, otherwise reads the ASCII files.
+    The results are cached so that repeated DustGrains.from_files calls with
+    the same arguments (e.g., for several models or sightlines) do not read
+    and parse the files again.
+
+    Parameters
+    ----------
+    componentname : 'string'
+        Name that givesn the dust composition
+    path : 'string'
+        Path to the location of the dust grain files
+    every_nth : int
+        Only use every nth size
+
+    Returns
+    -------
+    dict
+        grain sizes, default size distribution, wavelengths, cross sections,
+        scattering g, emission, and ISRF strengths.  The arrays are shared
+        between calls so they are read-only.
+    """
+    cachename = grain_cache_filename(componentname, path)
+    if grain_cache_current(componentname, path):
+        with np.load(cachename) as data:
+            tables = {name: data[name] for name in data.files}
+
+        # code to just pick every nth grain size
+        for name in ["sizes", "stochastic_heating", "cext", "cabs", "csca", "scat_g"]:
+            tables[name] = tables[name][::every_nth]
+        tables["emission"] = tables["emission"][:, ::every_nth, :]
+
+        # default size distributions
+        tables["size_dist"] = tables["sizes"] ** (-4.0)
+    else:
+        tables = read_grain_tables(componentname, path, every_nth)
+
+    ISRF_field_strengths = tables.pop("ISRF_field_strengths")
+    for tvals in tables.values():
+        tvals.setflags(write=False)
+    tables["ISRF_field_strengths"] = tuple(ISRF_field_strengths)
+
+    return tables
+
+
+def grain_cache_filename(componentname, path):
+    """
+    Name of the binary cache file of a component made by build_grain_cache.
+    """
+    return path + "INDIV-GRAINS-DGFIT_" + componentname + ".npz"
+
+
+def grain_cache_current(componentname, path):
+    """
+    Check that the binary cache file of a component exists and is not older
+    than any of its ASCII files (e.g., the ASCII files were updated after
+    the cache was made).
+
+    Parameters
+    ----------
+    componentname : 'string'
+        Name that givesn the dust composition
+    path : 'string'
+        Path to the location of the dust grain files
+
+    Returns
+    -------
+    bool
+        True if the cache file can be used
+    """
+    cachename = grain_cache_filename(componentname, path)
+    if not os.path.isfile(cachename):
+        return False
+    cache_time = os.path.getmtime(cachename)
+    return all(
+        os.path.getmtime(filename) <= cache_time
+        for filename, _ in grain_filelist(componentname, path)
+    )
+
+
+def build_grain_cache(componentname, path="./"):
+    """
+    Read the ASCII files of all the sizes of a component once and save them
+    in a single binary (numpy npz) file in the same directory.  Later loads
+    of the component use this file instead of parsing the ASCII files,
+    until any of the ASCII files is modified after it was made.
+
+    Parameters
+    ----------
+    componentname : 'string'
+        Name that givesn the dust composition
+    path : 'string'
+        Path to the location of the dust grain files
+
+    Returns
+    -------
+    'string'
+        name of the cache file
+    """
+    tables = read_grain_tables(componentname, path, 1)
+    del tables["size_dist"]
+    cachename = grain_cache_filename(componentname, path)
+    np.savez(cachename, **tables)
+    load_grain_tables.cache_clear()
+    return cachename
+
+
+def grain_filelist(componentname, path):
+    """
+    Names of the ASCII files of a component for all the sizes, with a single
+    directory scan (the files are not opened).
+
+    Parameters
+    ----------
+    componentname : 'string'
+        Name that givesn the dust composition
+    path : 'string'
+        Path to the location of the dust grain files
+
+    Returns
+    -------
+    list of tuples
+        (filename, size number) for each file, not sorted
+    """
+    dirname, pattern = os.path.split(
+        path + "INDIV-GRAINS-DGFIT_c_*" + componentname + "*.dat"
+    )
+    filelist = []
+    with os.scandir(dirname or ".") as entries:
+        for entry in entries:
+            if not fnmatch.fnmatch(entry.name, pattern):
+                continue
+            m = re.search("_s_(.+?).dat", entry.name)
+            if m:
+                sizenum = m.group(1)
+                filelist.append((os.path.join(dirname, entry.name), int(sizenum)))
+    return filelist
+
+
+def read_grain_tables(componentname, path, every_nth):
+    """
+    Read the precomputed dust grain information for all the sizes of a
+    component from the ASCII files.
+
+    Parameters
+    ----------
+    componentname : 'string'
+        Name that givesn the dust composition
+    path : 'string'
+        Path to the location of the dust grain files
+    every_nth : int
+        Only use every nth size
+
+    Returns
+    -------
+    dict
+        grain sizes, default size distribution, wavelengths, cross sections,
+        scattering g, emission, and ISRF strengths
+    """
+    # min/max wavelengths for storage
+    #    set here in case later we want to pass them via the function call
+    min_wave = 0.0
+    max_wave = 1e6
+    min_wave_emission = 0.0
+    max_wave_emission = 1e6
+
+    # get the filenames of this component for all sizes
+    filelist = grain_filelist(componentname, path)
+
+    # check if any files were found
+    if len(filelist) == 0:
+        raise FileNotFoundError(
+            "no files found for " + componentname + " with path = " + path
+        )
+
+    # code to just pick every nth grain size
+    # makes the fitting faster, but the size distributions coarser
+    #   sorted once from the smallest to the largest sizes
+    filelist.sort(key=lambda file: file[1])
+    filelist = filelist[::every_nth]
+
+    # setup the variables to store the grain information
+    n_sizes = len(filelist)
+    sizes = np.empty(n_sizes)
+    stochastic_heating = np.empty(n_sizes)
+
+    # loop over the files from the smallest to the largest sizes
+    for k, file in enumerate(filelist):
+        # read in the table of grain properties for this size
+        #   the grain size is in the first line
+        with open(file[0], "r") as f:
+            lines = f.read().splitlines()
+        space_pos = lines[0].find(" ", 5)
+        grain_size = float(lines[0][1:space_pos])
+
+        # metadata from the leading comment lines, parsed once here
+        comments = []
+        for line in lines:
+            if not line.startswith("#"):
+                break
+            comments.append(line[1:].strip())
+
+        # the C reader directly, no guessing of the format
+        t = Table.read(
+            lines,
+            format="ascii.commented_header",
+            header_start=-1,
+            fast_reader=True,
+            guess=False,
+        )
+
+        stochheated = False
+        for tcomment in comments:
+            if "StochasticallyHeated" in tcomment:
+                if "1" in tcomment:
+                    stochheated = True
+
+        # setup more variables now that we know the number of wavelengths
+        if k == 0:
+            # generate the indices to crop the wavelength to the
+            #      desired range
+            (gindxs,) = np.where(
+                (t["Wavelength"] >= min_wave) & (t["Wavelength"] <= max_wave)
+            )
+            (egindxs,) = np.where(
+                (t["Wavelength"] >= min_wave_emission)
+                & (t["Wavelength"] <= max_wave_emission)
+            )
+            # contiguous ranges (the usual case) are used as slices
+            #    so the per size column reads do not need a gather
+            if len(gindxs) > 0 and np.all(np.diff(gindxs) == 1):
+                gindxs = slice(gindxs[0], gindxs[-1] + 1)
+            if len(egindxs) > 0 and np.all(np.diff(egindxs) == 1):
+                egindxs = slice(egindxs[0], egindxs[-1] + 1)
+            wavelengths = np.array(t["Wavelength"][gindxs])
+            wavelengths_emission = np.array(t["Wavelength"][egindxs])
+            n_wavelengths = len(wavelengths)
+            n_wavelengths_emission = len(wavelengths_emission)
+            cext = np.empty((n_sizes, n_wavelengths))
+            cabs = np.empty((n_sizes, n_wavelengths))
+            csca = np.empty((n_sizes, n_wavelengths))
+            scat_g = np.empty((n_sizes, n_wavelengths))
+
+            ISRF_field_strengths = []
+            for tcomment in comments:
+                if "Scales" in tcomment:
+                    scales = tcomment.split(":")[1].strip()
+                    for number in scales.split():
+                        ISRF_field_strengths.append(float(number))
+
+            n_ISRF_strengths = len(ISRF_field_strengths)
+            emission = np.empty((n_ISRF_strengths, n_sizes, n_wavelengths_emission))
+            emission_cols = {
+                base: [base + str(i + 1) for i in range(n_ISRF_strengths)]
+                for base in ["StEm", "EqEm"]
+            }
+
+        # store the info
+        sizes[k] = grain_size
+        stochastic_heating[k] = stochheated
+        cext[k, :] = t["CExt"][gindxs]
+        csca[k, :] = t["CSca"][gindxs]
+        cabs[k, :] = t["CAbs"][gindxs]
+        scat_g[k, :] = t["G"][gindxs]
+
+        # all the ISRF strengths in one copy
+        if stochastic_heating[k]:
+            base = "StEm"
+        else:
+            base = "EqEm"
+        block = np.stack([t[cname] for cname in emission_cols[base]])
+        emission[:, k, :] = block[:, egindxs]
+
+    # convert emission from ergs/(s cm sr) to MJy/sr for all sizes at once
+    #   wavelengths in microns
+    #      convert from cm^-1 to Hz^-1 [lambda^2/c]
+    #      convert from ergs/(s Hz) to Jy [/1e-19]
+    #      convert from Jy/sr to MJy/sr [*1e-6]
+    #      convert from m^-2 to cm^-2 [*1e-4]
+    emission *= wavelengths_emission**2 * (1e-6 * 1e-4 / (2.998e10 * 1e-19))
+
+    tables = {
+        "sizes": sizes,
+        # default size distributions
+        "size_dist": sizes ** (-4.0),
+        "stochastic_heating": stochastic_heating,
+        "wavelengths": wavelengths,
+        "wavelengths_emission": wavelengths_emission,
+        "cext": cext,
+        "cabs": cabs,
+        "csca": csca,
+        "scat_g": scat_g,
+        "emission": emission,
+        "ISRF_field_strengths": np.array(ISRF_field_strengths),
+    }
+
+    return tables
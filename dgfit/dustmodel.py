@@ -1,4 +1,5 @@
 import math
+
 import numpy as np
 from scipy.special import erf
 
@@ -54,6 +55,36 @@ class DustModel(object):
         each entry is then a dictonary giving the value by parameter name.
         For the bins case, the dictonary is empty as the parameters is
         the size distribution.
+    atom_names : list of str
+        names of all the atoms in the components, fixed order used
+        for the natoms_arr results
+    atom_indxs : list of 'numpy.ndarray'
+        indices into atom_names for the atoms of each component
+    size_dists : 'numpy.ndarray'
+        size distributions of all the components in one array,
+        the component size_dist arrays are views into it
+        (assigning to a component size_dist sets the values in place)
+    size_slices : list of slices
+        slices of size_dists for each component
+    stacked_props : dict
+        grain properties of all the components stacked along the sizes,
+        set up when first needed by eff_grain_props_batch
+    component_cache : list of tuples
+        (key, results) of the last effective grain properties computed
+        for each component, used to only recompute components that changed
+    cache_sources : list of 'numpy.ndarray'
+        cabs arrays of the components the caches were computed for,
+        the caches are reset when the grain properties are replaced
+
+    Notes
+    -----
+    component_cache and stacked_props only depend on the size
+    distributions and radiation field (part of the component_cache keys)
+    and on the grain properties of the components.  The grain properties
+    are only checked by the identity of the component cabs arrays
+    (check_caches): replacing the grain arrays (e.g., from_files or
+    from_object) resets the caches, changing them in place is not detected
+    and needs new arrays to be assigned.
     """
 
     def __init__(
@@ -72,6 +103,13 @@ class DustModel(object):
         self.sizedisttype = "bins"
         self.n_params = None
         self.parameters = {}
+        self.atom_names = []
+        self.atom_indxs = []
+        self.size_dists = None
+        self.size_slices = []
+        self.component_cache = []
+        self.stacked_props = None
+        self.cache_sources = []
         self.abundance_constraint = limit_abundances
         self.variable_ISRF = variable_ISRF
 
@@ -89,6 +127,65 @@ class DustModel(object):
             self.n_params = []
             for component in self.components:
                 self.n_params.append(component.n_sizes)
+            self.component_cache = [None] * self.n_components
+
+            # all the size distributions in a single buffer
+            #   the component size distributions become views into it
+            #   (already done if the components are shared with another model)
+            if self.size_dists is None:
+                self.size_dists = np.concatenate(
+                    [component.size_dist for component in self.components]
+                )
+                k1 = 0
+                for component in self.components:
+                    k2 = k1 + component.n_sizes
+                    self.size_slices.append(slice(k1, k2))
+                    component.share_size_dist(self.size_dists[k1:k2])
+                    k1 = k2
+
+            # fixed ordering of the atoms over all components
+            for component in self.components:
+                for aname in component.atomic_comp_names:
+                    if aname not in self.atom_names:
+                        self.atom_names.append(aname)
+            for component in self.components:
+                self.atom_indxs.append(
+                    np.array(
+                        [
+                            self.atom_names.index(aname)
+                            for aname in component.atomic_comp_names
+                        ]
+                    )
+                )
+
+    def __getstate__(self):
+        # do not send the caches to other processes (e.g., pool workers)
+        state = self.__dict__.copy()
+        state["component_cache"] = [None] * self.n_components
+        state["stacked_props"] = None
+        state["cache_sources"] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # pickling copies the size distribution views separately
+        #   make them views into size_dists again
+        for k, component in enumerate(self.components):
+            component.share_size_dist(self.size_dists[self.size_slices[k]])
+
+    def check_caches(self):
+        """
+        Reset the caches if the grain properties of the components were
+        replaced (e.g., components reloaded with from_files or from_object)
+        since the caches were filled.
+        """
+        sources = [component.cabs for component in self.components]
+        if len(sources) != len(self.cache_sources) or any(
+            new is not old for new, old in zip(sources, self.cache_sources)
+        ):
+            self.component_cache = [None] * len(self.components)
+            self.stacked_props = None
+            self.cache_sources = sources
 
     def read_grain_files(self, componentnames, path="./", every_nth=5):
         """
@@ -163,6 +260,9 @@ class DustModel(object):
         self.n_components = full_dustmodel.n_components
         for component in full_dustmodel.components:
             self.components.append(component)
+        # the components share the size distribution buffer
+        self.size_dists = full_dustmodel.size_dists
+        self.size_slices = list(full_dustmodel.size_slices)
 
     def compute_size_dist(self, x, params):
         """
@@ -217,18 +317,23 @@ class DustModel(object):
             Description of returned object.
 
         """
-        k1 = 0
-        for k, component in enumerate(self.components):
-            delta_val = self.n_params[k]
-            k2 = k1 + delta_val
-            component.size_dist[:] = self.compute_size_dist(
-                component.sizes[:], params[k1:k2]
-            )
-            if self.variable_ISRF:
+        if self.sizedisttype == "bins":
+            # parameters are the size distributions, so a single copy
+            self.size_dists[:] = params[: len(self.size_dists)]
+        else:
+            k1 = 0
+            for k, component in enumerate(self.components):
+                k2 = k1 + self.n_params[k]
+                self.size_dists[self.size_slices[k]] = self.compute_size_dist(
+                    component.sizes, params[k1:k2]
+                )
+                k1 = k2
+
+        if self.variable_ISRF:
+            for component in self.components:
                 component.RF_strength = params[-1]
-            k1 += delta_val
 
-    def eff_grain_props(self, OD, predict_all=False):
+    def eff_grain_props(self, OD, predict_all=False, return_components=False):
         """
         Compute the effective grain properties of the ensemble of grain
         sizes and compositions.
@@ -240,77 +345,225 @@ class DustModel(object):
             observations to compute (only those needed for speed)
         predict_all : type
             Regardless of the ObsData, compute all possible observations
+        return_components : boolean
+            Also return the results for the individual components
 
         Returns
         -------
         dict
             Dictonary of predicted observations
-            E.g., keys of cext, natoms, emission, albedo, g
+            E.g., keys of cext, natoms, natoms_arr, emission, albedo, g
+        list of dict
+            Predicted observations for each component
+            (only if return_components is True, shared with the
+            component cache so should not be modified)
         """
-        # storage for results
-        _cabs = np.zeros(self.components[0].n_wavelengths)
-        _csca = np.zeros(self.components[0].n_wavelengths)
-        _natoms = {}
+        # only recompute the components whose size distribution or
+        #   radiation field changed since the last call
+        self.check_caches()
+        comp_results = []
+        for k, component in enumerate(self.components):
+            key = (
+                component.size_dist.tobytes(),
+                component.RF_strength,
+                OD.fit_ir_emission,
+                OD.fit_scat_a,
+                OD.fit_scat_g,
+                predict_all,
+            )
+            if self.component_cache[k] is None or self.component_cache[k][0] != key:
+                self.component_cache[k] = (
+                    key,
+                    component.eff_grain_props(OD, predict_all=predict_all),
+                )
+            comp_results.append(self.component_cache[k][1])
+
+        # sum each property over the components with a single reduction
+        #   components stacked along the first axis
+        def sum_comps(name):
+            return np.sum([cresults[name] for cresults in comp_results], axis=0)
+
+        # for the depletions (# of atoms), add to the matching atoms
+        _natoms = np.zeros(len(self.atom_names))
+        for k, cresults in enumerate(comp_results):
+            _natoms[self.atom_indxs[k]] += cresults["natoms_arr"]
+
+        results = {}
+        results["cabs"] = sum_comps("cabs")
+        results["csca"] = sum_comps("csca")
+        results["natoms"] = dict(zip(self.atom_names, _natoms))
+        results["natoms_arr"] = _natoms
 
         if OD.fit_ir_emission or predict_all:
-            _emission = np.zeros(self.components[0].n_wavelengths_emission)
+            results["emission"] = sum_comps("emission")
 
         if OD.fit_scat_a or predict_all:
-            _scat_a_cext = np.zeros(self.components[0].n_wavelengths_scat_a)
-            _scat_a_csca = np.zeros(self.components[0].n_wavelengths_scat_a)
+            # divide in place into the summed C(sca), zero without C(ext)
+            _cext = sum_comps("scat_a_cext")
+            _albedo = sum_comps("scat_a_csca")
+            gvals = _cext != 0
+            np.divide(_albedo, _cext, out=_albedo, where=gvals)
+            _albedo[~gvals] = 0.0
+            results["albedo"] = _albedo
 
         if OD.fit_scat_g or predict_all:
-            _g = np.zeros(self.components[0].n_wavelengths_scat_g)
-            _scat_g_csca = np.zeros(self.components[0].n_wavelengths_scat_g)
-
-        for component in self.components:
-            results = component.eff_grain_props(OD, predict_all=predict_all)
-
-            _tcabs = results["cabs"]
-            _tcsca = results["csca"]
-            _cabs += _tcabs
-            _csca += _tcsca
-
-            # for the depletions (# of atoms), a bit more careful work needed
-            _tnatoms = results["natoms"]
-            for aname in _tnatoms.keys():
-                if aname in _natoms.keys():
-                    _natoms[aname] += _tnatoms[aname]
-                else:
-                    _natoms[aname] = _tnatoms[aname]
+            # fused multiply and sum over the components
+            _g = np.einsum(
+                "k...,k...->...",
+                [cresults["scat_g_csca"] for cresults in comp_results],
+                [cresults["g"] for cresults in comp_results],
+            )
+            _csca = sum_comps("scat_g_csca")
+            gvals = _csca != 0
+            np.divide(_g, _csca, out=_g, where=gvals)
+            _g[~gvals] = 0.0
+            results["g"] = _g
+
+        if return_components:
+            return results, comp_results
+        return results
 
-            if OD.fit_ir_emission or predict_all:
-                _temission = results["emission"]
-                _emission += _temission
+    def eff_grain_props_batch(self, OD, params_batch, predict_all=False):
+        """
+        Compute the effective grain properties of the ensemble of grain
+        sizes and compositions for a batch of parameters.
+        Only for the bins case where the parameters are the size
+        distributions (plus the radiation field strength if variable).
 
-            if OD.fit_scat_a or predict_all:
-                _tscat_a_cext = results["scat_a_cext"]
-                _tscat_a_csca = results["scat_a_csca"]
-                _scat_a_cext += _tscat_a_cext
-                _scat_a_csca += _tscat_a_csca
+        Parameters
+        ----------
+        OD : ObsData object
+            Observed data object specifically used to determine which
+            observations to compute (only those needed for speed)
+        params_batch : 2D array of floats
+            Parameters of the size distribution function, one row per set
+        predict_all : type
+            Regardless of the ObsData, compute all possible observations
 
-            if OD.fit_scat_g or predict_all:
-                _tg = results["g"]
-                _tscat_g_csca = results["scat_g_csca"]
-                _g += _tscat_g_csca * _tg
-                _scat_g_csca += _tscat_g_csca
+        Returns
+        -------
+        dict
+            Dictonary of predicted observations, one row per set of parameters
+            E.g., keys of cext, natoms, natoms_arr, emission, albedo, g
+        """
+        n_batch = len(params_batch)
+        size_dists = params_batch[:, : len(self.size_dists)]
+
+        self.check_caches()
+        if self.stacked_props is None:
+            self.set_stacked_props()
+        stacked = self.stacked_props
+
+        # integration weights for all the components, stacked along the sizes
+        #   so each property is a single matrix multiplication
+        weights = np.concatenate(
+            [
+                component.integration_weights(size_dists[:, self.size_slices[k]])
+                for k, component in enumerate(self.components)
+            ],
+            axis=-1,
+        )
 
         results = {}
-        results["cabs"] = _cabs
-        results["csca"] = _csca
-        results["natoms"] = _natoms
+        results["cabs"] = weights @ stacked["cabs"]
+        results["csca"] = weights @ stacked["csca"]
+        _natoms = size_dists @ stacked["natoms"]
+        results["natoms"] = dict(zip(self.atom_names, _natoms.T))
+        results["natoms_arr"] = _natoms
 
+        # emission depends on the radiation field for each component
         if OD.fit_ir_emission or predict_all:
+            _emission = 0.0
+            for k, component in enumerate(self.components):
+                if self.variable_ISRF:
+                    RF_strengths = params_batch[:, -1]
+                else:
+                    RF_strengths = np.full(n_batch, component.RF_strength)
+                _emission += component.eff_emission_batch(
+                    weights[:, self.size_slices[k]], RF_strengths
+                )
             results["emission"] = _emission
 
         if OD.fit_scat_a or predict_all:
-            results["albedo"] = _scat_a_csca / _scat_a_cext
+            _cext = weights @ stacked["scat_a_cext"]
+            _albedo = weights @ stacked["scat_a_csca"]
+            gvals = _cext != 0
+            np.divide(_albedo, _cext, out=_albedo, where=gvals)
+            _albedo[~gvals] = 0.0
+            results["albedo"] = _albedo
 
         if OD.fit_scat_g or predict_all:
-            results["g"] = _g / _scat_g_csca
+            _csca = weights @ stacked["scat_g_csca"]
+            _g = weights @ stacked["g_csca"]
+            gvals = _csca != 0
+            np.divide(_g, _csca, out=_g, where=gvals)
+            _g[~gvals] = 0.0
+            results["g"] = _g
 
         return results
 
+    def set_stacked_props(self):
+        """
+        Stack the grain properties of all the components along the sizes,
+        so that the totals over all the components are single matrix
+        multiplications with the concatenated integration weights.
+        All the components need to be on the same wavelength grids.
+        """
+        self.stacked_props = {}
+        for name in ["cabs", "csca", "scat_a_cext", "scat_a_csca", "scat_g_csca"]:
+            self.stacked_props[name] = np.concatenate(
+                [getattr(component, name) for component in self.components]
+            )
+        self.stacked_props["g_csca"] = np.concatenate(
+            [component.g_csca() for component in self.components]
+        )
+        self.stacked_props["natoms"] = self.compute_natoms_basis().T
+
+    @staticmethod
+    def ext_alav(cabs, csca, out=None):
+        """
+        Extinction in magnitudes from the absorption and scattering
+        cross sections [1.086*(C(abs) + C(sca))] without intermediate
+        temporaries.
+
+        Parameters
+        ----------
+        cabs, csca : 'numpy.ndarray'
+            absorption and scattering cross sections
+        out : 'numpy.ndarray', optional
+            array for the result, can be cabs or csca to work in place
+
+        Returns
+        -------
+        'numpy.ndarray'
+            extinction
+        """
+        out = np.add(cabs, csca, out=out)
+        out *= 1.086
+        return out
+
+    def compute_natoms_basis(self):
+        """
+        Number of atoms/A(V) per unit size distribution value for all the
+        grain sizes of all the components.  The number of atoms is linear
+        in the size distributions, so natoms = basis @ size_dists with the
+        size distributions of all the components concatenated.
+
+        Returns
+        -------
+        'numpy.ndarray'
+            basis with shape (n_atoms, total number of sizes)
+            with the atoms in the order of atom_names
+        """
+        n_sizes = [component.n_sizes for component in self.components]
+        basis = np.zeros((len(self.atom_names), sum(n_sizes)))
+        k1 = 0
+        for k, component in enumerate(self.components):
+            k2 = k1 + n_sizes[k]
+            basis[self.atom_indxs[k], k1:k2] = component.natoms_basis()
+            k1 = k2
+        return basis
+
     def read_sizedist_from_file(self, filename):
         """
         Read in the size distribution from a file interpolating
@@ -327,16 +580,17 @@ class DustModel(object):
 
             # interpolate, otherwise assume exact match in sizes
             #   might want to add some checking here for robustness
-            if len(component.size_dist) != len(fitsdata[:][1]):
-                component.size_dist = 10 ** np.interp(
+            #   set in place as the size distributions are views into size_dists
+            if len(component.size_dist) != len(fitsdata["DIST"]):
+                component.size_dist[:] = 10 ** np.interp(
                     np.log10(component.sizes),
                     np.log10(fitsdata["SIZE"]),
                     np.log10(fitsdata["DIST"]),
                 )
             else:
-                component.size_dist = fitsdata["DIST"]
+                component.size_dist[:] = fitsdata["DIST"]
 
-    def lnprob_generic(self, obsdata):
+    def lnprob_generic(self, obsdata, results=None):
         """
         Compute the ln(prob) for the dust grain size and composition
         distribution as defined by the dustmodel.
@@ -345,90 +599,76 @@ class DustModel(object):
         ----------
         obsdata : ObsData object
             All the observed data
+        results : dict, optional
+            Predicted observations from eff_grain_props or
+            eff_grain_props_batch, computed if not given
 
         Returns
         -------
-        float
-            natural log of the probability
+        float or 'numpy.ndarray'
+            natural log of the probability, one value per size distribution
+            if batch results are given
         """
         # get the integrated dust properties
-        results = self.eff_grain_props(obsdata)
+        if results is None:
+            results = self.eff_grain_props(obsdata)
+
+        # weighted residuals for all the spectral observations
+        #   scaled by 1/sqrt(# points) so that a single dot product gives the
+        #   sum of the per observation type reduced chi-squares
+        resids = []
 
-        # compute the ln(prob) for A(l)/A(V)
-        lnp_alav = 0.0
+        # A(l)/A(V), one temporary reused in place for cext and the residuals
         if obsdata.fit_extinction:
-            cabs = results["cabs"]
-            csca = results["csca"]
-            cext = cabs + csca
-            dust_alav = 1.086 * cext
-            weights = 1.0 / (obsdata.ext_alav_unc)
-            bandvals = obsdata.ext_type != "spec"
-            if np.sum(bandvals) > 0:
-                weights[bandvals] *= 1000
-            lnp_alav = -0.5 * np.sum(((obsdata.ext_alav - dust_alav) * weights) ** 2)
-            lnp_alav /= obsdata.ext_npts
+            resid = self.ext_alav(results["cabs"], results["csca"])
+            np.subtract(obsdata.ext_alav, resid, out=resid)
+            resid *= obsdata.ext_alav_weights / math.sqrt(obsdata.ext_npts)
+            resids.append(resid)
 
-        # compute the ln(prob) for the depletions
-        lnp_dep = 0.0
-        if obsdata.fit_abundance:
-            natoms = results["natoms"]
-            for atomname in natoms.keys():
-                if natoms[atomname] < obsdata.abundance_av[atomname][0]:
-                    lnp_dep += 0.0
-                else:
-                    if self.abundance_constraint:
-                        if (
-                            natoms[atomname] - obsdata.abundance_av[atomname][0]
-                            > obsdata.abundance_av[atomname][1]
-                        ):
-                            lnp_dep += 1e30
-                        else:
-                            lnp_dep += (
-                                (natoms[atomname] - obsdata.abundance_av[atomname][0])
-                                / (obsdata.abundance_av[atomname][1])
-                            ) ** 2
-                    else:
-                        lnp_dep += (
-                            (natoms[atomname] - obsdata.abundance_av[atomname][0])
-                            / (obsdata.abundance_av[atomname][1])
-                        ) ** 2
-            lnp_dep *= -0.5
-            lnp_dep /= obsdata.abundance_npts
-
-        # compute the ln(prob) for IR emission
-        lnp_emission = 0.0
+        # IR emission
         if obsdata.fit_ir_emission:
-            emission = results["emission"]
-            lnp_emission = -0.5 * np.sum(
-                (
-                    ((obsdata.ir_emission_av - emission) / (obsdata.ir_emission_av_unc))
-                    ** 2
-                )
+            resid = obsdata.ir_emission_av - results["emission"]
+            resid *= obsdata.ir_emission_av_weights / math.sqrt(
+                obsdata.ir_emission_npts
             )
-            lnp_emission /= obsdata.ir_emission_npts
+            resids.append(resid)
 
-        # compute the ln(prob) for the dust albedo
-        lnp_albedo = 0.0
+        # dust albedo
         if obsdata.fit_scat_a:
-            albedo = results["albedo"]
-            lnp_albedo = -0.5 * np.sum(
-                (((obsdata.scat_albedo - albedo) / (obsdata.scat_albedo_unc)) ** 2)
-            )
-            lnp_albedo /= obsdata.scat_a_npts
+            resid = obsdata.scat_albedo - results["albedo"]
+            resid *= obsdata.scat_albedo_weights / math.sqrt(obsdata.scat_a_npts)
+            resids.append(resid)
 
-        # compute the ln(prob) for the dust g
-        lnp_g = 0.0
+        # dust g
         if obsdata.fit_scat_g:
-            g = results["g"]
-            lnp_g = -0.5 * np.sum((((obsdata.scat_g - g) / (obsdata.scat_g_unc)) ** 2))
-            lnp_g /= obsdata.scat_g_npts
+            resid = obsdata.scat_g - results["g"]
+            resid *= obsdata.scat_g_weights / math.sqrt(obsdata.scat_g_npts)
+            resids.append(resid)
 
-        # combine the lnps
-        lnp = lnp_alav + lnp_dep + lnp_emission + lnp_albedo + lnp_g
+        lnp = 0.0
+        if len(resids) > 0:
+            resid = np.concatenate(resids, axis=-1)
+            lnp = -0.5 * np.einsum("...i,...i->...", resid, resid)
 
-        if math.isinf(lnp) | math.isnan(lnp):
+        # compute the ln(prob) for the depletions
+        if obsdata.fit_abundance:
+            indxs = [obsdata.abundance_av_indxs[aname] for aname in self.atom_names]
+            abund = obsdata.abundance_av_vals[indxs]
+            abund_unc = obsdata.abundance_av_uncs[indxs]
+            # atoms along the last axis
+            delta = results["natoms_arr"] - abund
+            lnp_atoms = (delta / abund_unc) ** 2
+            if self.abundance_constraint:
+                lnp_atoms = np.where(delta > abund_unc, 1e30, lnp_atoms)
+            # no penalty for using fewer atoms than available
+            lnp_atoms = np.where(delta < 0.0, 0.0, lnp_atoms)
+            lnp = lnp - 0.5 * np.sum(lnp_atoms, axis=-1) / obsdata.abundance_npts
+
+        if np.ndim(lnp) > 0:
+            return np.where(np.isfinite(lnp), lnp, -np.inf)
+        if not math.isfinite(lnp):
             return -np.inf
-        return lnp
+        return float(lnp)
 
     @staticmethod
     def lnprob(params, obsdata, dustmodel):
@@ -462,6 +702,38 @@ class DustModel(object):
 
         return dustmodel.lnprob_generic(obsdata) + lnp_bound
 
+    @staticmethod
+    def lnprob_batch(params_batch, obsdata, dustmodel):
+        """
+        Compute the full probability function including priors for a
+        batch of parameters at once.
+        Static function as it will be called from the fitter
+        (e.g., emcee with vectorize=True)
+
+        Parameters
+        ----------
+        params_batch : 2D array of floats
+            Parameters of the size distribution function, one row per set
+        obsdata : ObsData object
+            Observed data to be fit
+        dustmodel : DustModel object
+            Dust model information
+
+        Returns
+        -------
+        'numpy.ndarray'
+            natural log of the probability for each set of parameters
+        """
+        params_batch = np.atleast_2d(params_batch)
+
+        # prior
+        #    make sure the size distributions are all positve
+        lnp_bound = np.where(np.any(params_batch < 0.0, axis=1), -1e20, 0.0)
+
+        results = dustmodel.eff_grain_props_batch(obsdata, params_batch)
+
+        return dustmodel.lnprob_generic(obsdata, results=results) + lnp_bound
+
     def initial_walkers(self, p0, nwalkers):
         """
         Setup the walkers based on the initial parameters p0
@@ -476,24 +748,21 @@ class DustModel(object):
 
         Returns
         -------
-        array of floats
-            concatenated set of initial walker positions
+        'numpy.ndarray'
+            initial walker positions with shape (nwalkers, ndim)
         """
         self.ndim = len(p0)
         self.nwalkers = nwalkers
         # some parameters are negative, so need to be handled
         psigns = np.sign(p0)
-        p = [
-            psigns
-            * (
-                10
-                ** (
-                    np.log10(np.absolute(p0))
-                    + 0.1 * np.random.uniform(-1, 1.0, self.ndim)
-                )
+        # perturb all the walkers at once, one walker per row
+        p = psigns * (
+            10
+            ** (
+                np.log10(np.absolute(p0))
+                + 0.1 * np.random.uniform(-1, 1.0, (self.nwalkers, self.ndim))
             )
-            for k in range(self.nwalkers)
-        ]
+        )
 
         return p
 
@@ -526,7 +795,8 @@ class DustModel(object):
         pheader.add_comment("kgordon@stsci.edu")
         phdu = fits.PrimaryHDU(header=pheader)
 
-        hdulist = fits.HDUList([phdu])
+        # collect all the HDUs and make the HDUList once at the end
+        hdus = [phdu]
 
         # output the dust grain size distribution
         k1 = 0
@@ -557,107 +827,80 @@ class DustModel(object):
                         cparam[0], cparam[1], "parameters of size distribution model"
                     )
 
-            hdulist.append(tbhdu)
+            hdus.append(tbhdu)
 
         # output the resulting observable parameters
-        results = self.eff_grain_props(OD, predict_all=True)
-        cabs = results["cabs"]
-        csca = results["csca"]
-        natoms = results["natoms"]
+        results, comp_results = self.eff_grain_props(
+            OD, predict_all=True, return_components=True
+        )
 
         # natoms
-        col1 = fits.Column(
-            name="NAME", format="A2", array=np.array(list(natoms.keys()))
-        )
-        col2 = fits.Column(
-            name="ABUND", format="E", array=np.array(list(natoms.values()))
-        )
+        col1 = fits.Column(name="NAME", format="A2", array=self.atom_names)
+        col2 = fits.Column(name="ABUND", format="E", array=results["natoms_arr"])
         cols = fits.ColDefs([col1, col2])
         tbhdu = fits.BinTableHDU.from_columns(cols)
         tbhdu.header.set("EXTNAME", "Abundances", "abundances in units of # atoms/A(V)")
-        hdulist.append(tbhdu)
-
-        # extinction
-        col1 = fits.Column(
-            name="WAVE", format="E", array=self.components[0].wavelengths
-        )
-        col2 = fits.Column(name="EXT", format="E", array=1.086 * (cabs + csca))
-        all_cols_ext = [col1, col2]
-
-        # emission
-        emission = results["emission"]
-        col1 = fits.Column(
-            name="WAVE", format="E", array=self.components[0].wavelengths_emission
-        )
-        col2 = fits.Column(name="EMIS", format="E", array=emission)
-        all_cols_emis = [col1, col2]
-
-        # albedo
-        albedo = results["albedo"]
-        tvals = self.components[0].wavelengths_scat_a
-        col1 = fits.Column(name="WAVE", format="E", array=tvals)
-        col2 = fits.Column(name="ALBEDO", format="E", array=albedo)
-        all_cols_albedo = [col1, col2]
-
-        # g
-        g = results["g"]
-        tvals = self.components[0].wavelengths_scat_g
-        col1 = fits.Column(name="WAVE", format="E", array=tvals)
-        col2 = fits.Column(name="G", format="E", array=g)
-        all_cols_g = [col1, col2]
-
-        for k, component in enumerate(self.components):
-            results = component.eff_grain_props(OD, predict_all=True)
-            tcabs = results["cabs"]
-            tcsca = results["csca"]
-            # tnatoms = results['natoms']
-
-            tcol = fits.Column(
-                name="EXT" + str(k + 1), format="E", array=1.086 * (tcabs + tcsca)
-            )
-            all_cols_ext.append(tcol)
-
-            temission = results["emission"]
-            tcol = fits.Column(name="EMIS" + str(k + 1), format="E", array=temission)
-            all_cols_emis.append(tcol)
-
-            talbedo = results["albedo"]
-            tcol = fits.Column(name="ALBEDO" + str(k + 1), format="E", array=talbedo)
-            all_cols_albedo.append(tcol)
-
-            tg = results["g"]
-            tcol = fits.Column(name="G" + str(k + 1), format="E", array=tg)
-            all_cols_g.append(tcol)
-
-            ISRF = component.RF_strength
+        hdus.append(tbhdu)
+
+        # the totals followed by the individual components
+        all_results = [results] + comp_results
+        suffixes = [""] + [str(k + 1) for k in range(len(self.components))]
+
+        def stack_results(name):
+            return np.stack([cresults[name] for cresults in all_results])
+
+        # extinction for the totals and all the components in one pass
+        ext_all = stack_results("cabs")
+        self.ext_alav(ext_all, stack_results("csca"), out=ext_all)
+
+        comp0 = self.components[0]
+        tables = [
+            (
+                "EXT",
+                ext_all,
+                comp0.wavelengths,
+                "Extinction",
+                "extinction in A(lambda)/A(V)",
+            ),
+            (
+                "EMIS",
+                stack_results("emission"),
+                comp0.wavelengths_emission,
+                "Emission",
+                "emission MJy/sr/A(V)",
+            ),
+            (
+                "ALBEDO",
+                stack_results("albedo"),
+                comp0.wavelengths_scat_a,
+                "Albedo",
+                "dust scattering albedo",
+            ),
+            (
+                "G",
+                stack_results("g"),
+                comp0.wavelengths_scat_g,
+                "G",
+                "dust scattering phase function asymmetry",
+            ),
+        ]
 
         # now output the results
-        #    extinction
-        cols = fits.ColDefs(all_cols_ext)
-        tbhdu = fits.BinTableHDU.from_columns(cols)
-        tbhdu.header.set("EXTNAME", "Extinction", "extinction in A(lambda)/A(V)")
-        hdulist.append(tbhdu)
-
-        #    emission
-        cols = fits.ColDefs(all_cols_emis)
-        tbhdu = fits.BinTableHDU.from_columns(cols)
-        tbhdu.header.set("EXTNAME", "Emission", "emission MJy/sr/A(V)")
-        tbhdu.header.set("ISRF", ISRF, "The ISRF strength")
-        hdulist.append(tbhdu)
-
-        #    albedo
-        cols = fits.ColDefs(all_cols_albedo)
-        tbhdu = fits.BinTableHDU.from_columns(cols)
-        tbhdu.header.set("EXTNAME", "Albedo", "dust scattering albedo")
-        hdulist.append(tbhdu)
-
-        #    g
-        cols = fits.ColDefs(all_cols_g)
-        tbhdu = fits.BinTableHDU.from_columns(cols)
-        tbhdu.header.set("EXTNAME", "G", "dust scattering phase function asymmetry")
-        hdulist.append(tbhdu)
+        for colname, vals, waves, extname, comment in tables:
+            cols = [fits.Column(name="WAVE", format="E", array=waves)]
+            cols += [
+                fits.Column(name=colname + suffix, format="E", array=cvals)
+                for suffix, cvals in zip(suffixes, vals)
+            ]
+            tbhdu = fits.BinTableHDU.from_columns(cols)
+            tbhdu.header.set("EXTNAME", extname, comment)
+            if colname == "EMIS":
+                tbhdu.header.set(
+                    "ISRF", self.components[-1].RF_strength, "The ISRF strength"
+                )
+            hdus.append(tbhdu)
 
-        hdulist.writeto(filename, overwrite=True)
+        fits.HDUList(hdus).writeto(filename, overwrite=True)
 
     @staticmethod
     def get_percentile_vals(chain, ndim):
@@ -673,16 +916,12 @@ class DustModel(object):
 
         Returns
         -------
-        tuple of floats
+        tuple of 'numpy.ndarray'
             (p50, p84-p50, p50-p16)
         """
         samples = chain.reshape((-1, ndim))
-        values = map(
-            lambda v: (v[1], v[2] - v[1], v[1] - v[0]),
-            zip(*np.percentile(samples, [16, 50, 84], axis=0)),
-        )
-        val_50p, punc, munc = zip(*values)
-        return (val_50p, punc, munc)
+        p16, p50, p84 = np.percentile(samples, [16, 50, 84], axis=0)
+        return (p50, p84 - p50, p50 - p16)
 
     def save_50percentile_results(
         self, oname, sampler, obsdata, nburn=0, cur_step=None
@@ -743,15 +982,11 @@ class DustModel(object):
             Current step number
         """
         # get the best fit values
-        max_lnp = -1e20
         if cur_step is None:
             cur_step = len(sampler.lnprobability[0])
-        for k in range(self.nwalkers):
-            tmax_lnp = np.max(sampler.lnprobability[k, 0:cur_step])
-            if tmax_lnp > max_lnp:
-                max_lnp = tmax_lnp
-                (indxs,) = np.where(sampler.lnprobability[k] == tmax_lnp)
-                fit_params_best = sampler.chain[k, indxs[0], :]
+        lnprobs = sampler.lnprobability[:, 0:cur_step]
+        k, i = np.unravel_index(np.argmax(lnprobs), lnprobs.shape)
+        fit_params_best = sampler.chain[k, i, :]
 
         self.set_size_dist(fit_params_best)
 
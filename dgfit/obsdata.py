@@ -70,6 +70,10 @@ class ObsData(object):
             self.ext_alav = self.ext_alav[sindxs]
             self.ext_alav_unc = self.ext_alav_unc[sindxs]
             self.ext_type = self.ext_type[sindxs]
+
+            # fit weights, band data given much higher weight than spectra
+            self.ext_alav_weights = 1.0 / self.ext_alav_unc
+            self.ext_alav_weights[self.ext_type != "spec"] *= 1000
         else:
             self.ext_waves = np.logspace(np.log10(0.0912), np.log10(32.0), 200)
 
@@ -136,6 +140,10 @@ class ObsData(object):
             self.scat_g = np.array(t["g"])
             self.scat_g_unc = np.array(t["unc"])
 
+            # fit weights
+            self.scat_albedo_weights = 1.0 / self.scat_albedo_unc
+            self.scat_g_weights = 1.0 / self.scat_g_unc
+
         else:
             self.scat_a_waves = np.logspace(np.log10(0.1), np.log10(5.0), 100)
             self.scat_g_waves = np.logspace(np.log10(0.1), np.log10(5.0), 100)
@@ -160,6 +168,7 @@ class ObsData(object):
                 np.square(rel_ir_emission_unc) + np.square(avnhi_rel_unc)
             )
             self.ir_emission_npts = len(self.ir_emission_av)
+            self.ir_emission_av_weights = 1.0 / self.ir_emission_av_unc
 
             # abundance conversion
             self.abundance_av = {}
@@ -186,6 +195,14 @@ class ObsData(object):
                 self.abundance_av[key] = (new_abund, new_abund_unc)
                 self.total_abundance_av[key] = (new_tot_abund, new_tot_abund_unc)
 
+            # packed versions for vectorized calculations
+            self.abundance_av_indxs = {
+                key: k for k, key in enumerate(self.abundance_av.keys())
+            }
+            abund_av = np.array(list(self.abundance_av.values()), dtype=np.float64)
+            self.abundance_av_vals = abund_av[:, 0]
+            self.abundance_av_uncs = abund_av[:, 1]
+
             # extinction normalization from A(V) to N(HI)
             self.ext_alnhi = self.ext_alav * self.avnhi
             self.ext_alnhi_unc = np.square(
@@ -0,0 +1,229 @@
+# helpers shared by the single grain plotting scripts
+import argparse
+import contextlib
+import importlib.resources as importlib_resources
+import os
+
+import matplotlib
+import numpy as np
+
+from dgfit.obsdata import ObsData
+from dgfit.dustgrains import DustGrains, allowed_components
+
+
+def grain_parser(everynth=1):
+    """
+    Commandline parser with the options common to the single grain plots.
+
+    Parameters
+    ----------
+    everynth : int, optional
+        default for using every nth grain size
+
+    Returns
+    -------
+    'argparse.ArgumentParser'
+        parser, more options can be added by the calling script
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-c",
+        "--composition",
+        nargs="+",
+        choices=sorted(allowed_components),
+        default=["astro-silicates"],
+        help="Grain composition(s), one figure is made for each",
+    )
+    parser.add_argument(
+        "--obsdata",
+        type=str,
+        default="none",
+        help="transform to observed data grids, with the name of the observed data file as input",
+    )
+    parser.add_argument(
+        "--everynth", type=int, default=everynth, help="Use every nth grain size"
+    )
+    parser.add_argument("--png", help="save figure as a png file", action="store_true")
+    parser.add_argument("--eps", help="save figure as an eps file", action="store_true")
+    parser.add_argument("--pdf", help="save figure as a pdf file", action="store_true")
+    return parser
+
+
+def select_backend(args):
+    """
+    Select the non-interactive Agg backend when only saving files, so that
+    no GUI backend gets loaded.  Needs to be called before pyplot is imported.
+
+    Parameters
+    ----------
+    args : 'argparse.Namespace'
+        options parsed with a parser from grain_parser
+    """
+    if args.png or args.eps or args.pdf:
+        matplotlib.use("Agg")
+
+
+@contextlib.contextmanager
+def grain_data_path():
+    """
+    Directory with the package data, set the DGFIT_DATA_PATH environment
+    variable to use a data directory directly and skip the lookup (and
+    possible extraction) of the installed package data.
+
+    Yields
+    ------
+    str
+        data directory, containing the indiv_grain subdirectory
+    """
+    env_path = os.environ.get("DGFIT_DATA_PATH")
+    if env_path:
+        yield env_path
+    else:
+        ref = importlib_resources.files("dgfit") / "data"
+        with importlib_resources.as_file(ref) as data_path:
+            yield str(data_path)
+
+
+def load_grains(args):
+    """
+    Read the grain properties of each of the compositions selected by the
+    commandline options. The observed data is only read once for all of them.
+
+    Parameters
+    ----------
+    args : 'argparse.Namespace'
+        options parsed with a parser from grain_parser
+
+    Yields
+    ------
+    tuple
+        (composition, DustGrains object,
+         ObsData object or "none" without observed data)
+    """
+    if args.obsdata != "none":
+        OD = ObsData(args.obsdata)
+    else:
+        OD = "none"
+
+    # each composition is read when needed, only one is kept in memory
+    with grain_data_path() as data_path:
+        for composition in args.composition:
+            DG = DustGrains()
+            DG.from_files(
+                composition,
+                path=data_path + "/indiv_grain/",
+                every_nth=args.everynth,
+            )
+            if OD != "none":
+                new_DG = DustGrains()
+                new_DG.from_object(DG, OD)
+                DG = new_DG
+            yield (composition, DG, OD)
+
+
+def save_or_show(fig, basename, png=False, eps=False, pdf=False):
+    """
+    Save the figure in all the requested formats, or show it if none are.
+
+    Parameters
+    ----------
+    fig : 'matplotlib.figure.Figure'
+        figure to save or show
+    basename : str
+        filename without the extension
+    png, eps, pdf : bool, optional
+        formats to save the figure in
+    """
+    # imported here so that the scripts can select the backend first
+    import matplotlib.pyplot as plt
+
+    formats = [ext for ext, save in [("png", png), ("eps", eps), ("pdf", pdf)] if save]
+    for ext in formats:
+        fig.savefig(basename + "." + ext)
+    if formats:
+        # free the figure, several can be made in a row
+        plt.close(fig)
+    else:
+        plt.show()
+
+
+def sort_indices(vals):
+    """
+    Indices that sort the values, skipping the sort for already sorted
+    values (e.g., the wavelength grids of the grain files).
+
+    Parameters
+    ----------
+    vals : 'numpy.ndarray'
+        values to sort
+
+    Returns
+    -------
+    'numpy.ndarray' or None
+        sorting indices, None if the values are already sorted
+    """
+    if np.all(vals[1:] >= vals[:-1]):
+        return None
+    return np.argsort(vals)
+
+
+def sorted_cross_sections(DG):
+    """
+    Wavelength sorted cross sections of all the grain sizes.
+
+    Parameters
+    ----------
+    DG : DustGrains object
+        grain properties
+
+    Returns
+    -------
+    tuple of 'numpy.ndarray'
+        (wavelengths, cabs, csca, cext), the cross sections
+        with shape (n_sizes, n_wavelengths) in row-major order, these are
+        the DG arrays themselves if already sorted and row-major and should
+        not be modified
+    """
+    ws_indxs = sort_indices(DG.wavelengths)
+    if ws_indxs is None:
+        # row-major so that each grain size is a contiguous slice
+        return (
+            DG.wavelengths,
+            np.ascontiguousarray(DG.cabs),
+            np.ascontiguousarray(DG.csca),
+            np.ascontiguousarray(DG.cext),
+        )
+    return (
+        DG.wavelengths[ws_indxs],
+        np.take(DG.cabs, ws_indxs, axis=1),
+        np.take(DG.csca, ws_indxs, axis=1),
+        np.take(DG.cext, ws_indxs, axis=1),
+    )
+
+
+def sorted_emission(DG, ISRF):
+    """
+    Wavelength sorted emission of all the grain sizes.
+
+    Parameters
+    ----------
+    DG : DustGrains object
+        grain properties
+    ISRF : float
+        ISRF strength to interpolate the emission to
+
+    Returns
+    -------
+    tuple of 'numpy.ndarray'
+        (emission wavelengths, emission), the emission
+        with shape (n_sizes, n_wavelengths_emission) in row-major order,
+        not a copy if already sorted and row-major and should not be modified
+    """
+    emission = DG.interpol_emission(ISRF)
+    ews_indxs = sort_indices(DG.wavelengths_emission)
+    if ews_indxs is None:
+        return (DG.wavelengths_emission, np.ascontiguousarray(emission))
+    return (
+        DG.wavelengths_emission[ews_indxs],
+        np.take(emission, ews_indxs, axis=1),
+    )
@@ -12,9 +12,10 @@ from dgfit.obsdata import ObsData
 def get_krange(x, logaxis=False, in_range=[0]):
     prange = np.array([0.0, 0.0])
     if logaxis:
+        # only positive values, without making a copy of them
         gindxs = x > 0
-        min_x = np.amin(x[gindxs])
-        max_x = np.amax(x[gindxs])
+        min_x = np.amin(x, where=gindxs, initial=np.inf)
+        max_x = np.amax(x, where=gindxs, initial=-np.inf)
     else:
         min_x = np.amin(x)
         max_x = np.amax(x)
@@ -56,34 +57,32 @@ def plot_dgfit_sizedist(
     else:
         plot_uncs = False
 
-    yrange = [0]
     all_yvals = []
     for i in range(hdulist[0].header["NCOMPS"]):
         hdu = hdulist[i + 1]
 
-        xvals = hdu.data["SIZE"] * 1e4
-        yvals = hdu.data["DIST"]
+        # get the columns once
+        data = hdu.data
+        sizes = data["SIZE"]
+        xvals = sizes * 1e4
+        yvals = data["DIST"]
 
         if np.sum(yvals) == 0:
             print(f"Composition {i} is zero")
             continue
 
         if plot_uncs:
-            yvals_punc = hdu.data["DISTPUNC"]
-            yvals_munc = hdu.data["DISTMUNC"]
+            yvals_punc = data["DISTPUNC"]
+            yvals_munc = data["DISTMUNC"]
 
         if mass:
-            xvals3 = hdu.data["SIZE"] ** 3
+            # multiplies instead of the slower general power
+            xvals3 = sizes * sizes * sizes
             yvals = yvals * xvals3
             if plot_uncs:
                 yvals_punc = yvals_punc * xvals3
                 yvals_munc = yvals_munc * xvals3
 
-        yrange = get_krange(yvals, logaxis=True, in_range=yrange)
-        if plot_uncs:
-            yrange = get_krange(yvals - yvals_munc, logaxis=True, in_range=yrange)
-            yrange = get_krange(yvals + yvals_punc, logaxis=True, in_range=yrange)
-
         gindxs = yvals > 0
         all_yvals.append(np.max(yvals))
 
@@ -340,7 +339,7 @@ def main():
     fig, ax = pyplot.subplots(ncols=3, nrows=2, figsize=(15, 10))
 
     # open the DGFit results
-    hdulist = fits.open(args.filename)
+    hdulist = fits.open(args.filename, memmap=True)
 
     # get the observed data
     OD = ObsData(args.obsfile)
@@ -378,7 +377,7 @@ def main():
             repstr = "fin"
         else:
             repstr = "best_optimizer"
-        hdulist2 = fits.open(args.filename.replace(repstr, "start"))
+        hdulist2 = fits.open(args.filename.replace(repstr, "start"), memmap=True)
         plot_dgfit_sizedist(
             ax[0, 0], hdulist2, fontsize=fontsize, plegend=False, ltype="--", alpha=0.50
         )
@@ -1,80 +1,51 @@
-import argparse
-import importlib.resources as importlib_resources
-
-import matplotlib.pyplot as plt
 import matplotlib
 import numpy as np
 from matplotlib.cm import ScalarMappable
+from matplotlib.collections import LineCollection
 from matplotlib.cm import get_cmap
 from matplotlib.colors import LogNorm
 from matplotlib.ticker import LogLocator
 
-from dgfit.obsdata import ObsData
-from dgfit.dustgrains import DustGrains
+from dgfit.plotting.helpers import (
+    grain_parser,
+    load_grains,
+    save_or_show,
+    select_backend,
+    sorted_cross_sections,
+    sorted_emission,
+)
 
 
 def main():
-
     # commandline parser
-    parser = argparse.ArgumentParser()
+    parser = grain_parser(everynth=5)
     parser.add_argument(
-        "-c",
-        "--composition",
-        choices=[
-            "astro-silicates",
-            "astro-carbonaceous",
-            "astro-graphite",
-            "PAH-Z04",
-            "Graphite-Z04",
-            "Silicates-Z04",
-            "ACH2-Z04",
-            "Silicates1-Z04",
-            "Silicates2-Z04",
-            "Carbonaceous-HD23",
-            "AstroDust-HD23",
-            "a-C-Themis",
-            "a-C:H-Themis",
-            "aSil-2-Themis",
-        ],
-        default="astro-silicates",
-        help="Grain composition",
-    )
-    parser.add_argument(
-        "--obsdata",
-        type=str,
-        default="none",
-        help="transform to observed data grids, with the name of the observed data file as input",
-    )
-    parser.add_argument(
-        "--everynth", type=int, default=5, help="Use every nth grain size"
+        "--ISRF", default=1.0, type=float, help="Choose an ISRF strength"
     )
     parser.add_argument(
-        "--ISRF", default=1.0, type=float, help="Choose an ISRF strength"
+        "--mesh",
+        help="show the cross sections as images of grain size versus wavelength",
+        action="store_true",
     )
-    parser.add_argument("--png", help="save figure as a png file", action="store_true")
-    parser.add_argument("--eps", help="save figure as an eps file", action="store_true")
-    parser.add_argument("--pdf", help="save figure as a pdf file", action="store_true")
     args = parser.parse_args()
-
-    DG = DustGrains()
-    ref = importlib_resources.files("dgfit") / "data"
-    with importlib_resources.as_file(ref) as data_path:
-        DG.from_files(
-            args.composition,
-            path=str(data_path) + "/indiv_grain/",
-            every_nth=args.everynth,
+    select_backend(args)
+
+    for composition, DG, _ in load_grains(args):
+        plot(
+            DG,
+            composition,
+            args.ISRF,
+            args.png,
+            args.eps,
+            args.pdf,
+            mesh=args.mesh,
         )
 
-    if args.obsdata != "none":
-        OD = ObsData(args.obsdata)
-        new_DG = DustGrains()
-        new_DG.from_object(DG, OD)
-        DG = new_DG
 
-    plot(DG, args.composition, args.ISRF, args.png, args.eps, args.pdf)
+def plot(DG, composition, ISRF, png=False, eps=False, pdf=False, mesh=False):
+    # imported here so that main can select the backend first
+    import matplotlib.pyplot as plt
 
-
-def plot(DG, composition, ISRF, png=False, eps=False, pdf=False):
     # setup the plots
     fontsize = 12
     font = {"size": fontsize}
@@ -87,70 +58,88 @@ def plot(DG, composition, ISRF, png=False, eps=False, pdf=False):
 
     fig, ax = plt.subplots(ncols=3, nrows=2, figsize=(20, 10))
 
-    ws_indxs = np.argsort(DG.wavelengths)
-    ews_indxs = np.argsort(DG.wavelengths_emission)
-    waves = DG.wavelengths[ws_indxs]
+    # sort the cross sections once, the rows are then contiguous slices
+    waves, cabs, csca, cext = sorted_cross_sections(DG)
+    # undefined (not plotted) where there is no extinction
+    albedo = np.divide(
+        DG.scat_a_csca,
+        DG.scat_a_cext,
+        out=np.full_like(DG.scat_a_csca, np.nan),
+        where=DG.scat_a_cext > 0,
+    )
 
     num_segments = DG.n_sizes
-    DG.sizes *= 10**4
+    # display copy in micron, DG itself is left unchanged
+    sizes_um = DG.sizes * 1e4
     cmap = get_cmap("jet", num_segments)
-    norm = LogNorm(vmin=min(DG.sizes), vmax=max(DG.sizes))
-    colors = [cmap(i) for i in range(num_segments)]
-
-    for i in range(DG.n_sizes):
-        pcolor = colors[i]
-
-        ax[0, 0].plot(waves, DG.cabs[i, ws_indxs], color=pcolor)
-        ax[0, 0].set_xlabel(r"$\lambda$ [$\mu m$]")
-        ax[0, 0].set_ylabel("C(abs)")
-        ax[0, 0].set_xscale("log")
-        ax[0, 0].set_yscale("log")
-
-        ax[0, 1].plot(waves, DG.csca[i, ws_indxs], color=pcolor)
-        ax[0, 1].set_xlabel(r"$\lambda$ [$\mu m$]")
-        ax[0, 1].set_ylabel("C(sca)")
-        ax[0, 1].set_xscale("log")
-        ax[0, 1].set_yscale("log")
-
-        ax[0, 2].plot(waves, DG.cext[i, ws_indxs], color=pcolor)
-        ax[0, 2].set_xlabel(r"$\lambda$ [$\mu m$]")
-        ax[0, 2].set_ylabel("C(ext)")
-        ax[0, 2].set_xscale("log")
-        ax[0, 2].set_yscale("log")
-
-        ax[1, 0].plot(
-            DG.wavelengths_scat_a,
-            DG.scat_a_csca[i, :] / DG.scat_a_cext[i, :],
-            "o",
-            color=pcolor,
-        )
-        ax[1, 0].set_xlabel(r"$\lambda$ [$\mu m$]")
-        ax[1, 0].set_ylabel("albedo")
-        ax[1, 0].set_xscale("log")
-        ax[1, 0].xaxis.set_minor_locator(
-            LogLocator(base=10.0, subs=[2.0, 4.0], numticks=10)
-        )
-
-        ax[1, 1].plot(DG.wavelengths_scat_g, DG.scat_g[i, :], "o", color=pcolor)
-        ax[1, 1].set_xlabel(r"$\lambda$ [$\mu m$]")
-        ax[1, 1].set_ylabel("g")
-        ax[1, 1].set_xscale("log")
-        ax[1, 1].xaxis.set_minor_locator(
-            LogLocator(base=10.0, subs=[2.0, 4.0], numticks=10)
+    norm = LogNorm(vmin=sizes_um.min(), vmax=sizes_um.max())
+    colors = cmap(np.arange(num_segments))
+
+    # the emission does not depend on the grain size, interpolate it only once
+    waves_em, emission_sorted = sorted_emission(DG, ISRF)
+
+    # png and eps output cannot resolve very long wavelength grids,
+    # only keep every nth point (pdf and interactive plots keep them all)
+    if (png or eps) and not pdf:
+        step = max(1, len(waves) // 4000)
+        waves = waves[::step]
+        cabs, csca, cext = cabs[:, ::step], csca[:, ::step], cext[:, ::step]
+        step_em = max(1, len(waves_em) // 4000)
+        waves_em = waves_em[::step_em]
+        emission_sorted = emission_sorted[:, ::step_em]
+
+    ylabels = ["C(abs)", "C(sca)", "C(ext)", "albedo", "g", "Emission"]
+    line_panels = [
+        (ax[0, 0], waves, cabs),
+        (ax[0, 1], waves, csca),
+        (ax[0, 2], waves, cext),
+        (ax[1, 2], waves_em, emission_sorted),
+    ]
+    if mesh:
+        # a single image per cross section, the values are given by the colors
+        for k, (cax, xvals, yvals) in enumerate(line_panels[:3]):
+            qmesh = cax.pcolormesh(
+                xvals,
+                sizes_um,
+                yvals,
+                norm=LogNorm(),
+                shading="nearest",
+                cmap="viridis",
+            )
+            fig.colorbar(qmesh, ax=cax, label=ylabels[k])
+            ylabels[k] = r"$a$ [$\mu m$]"
+        line_panels = line_panels[3:]
+
+    # one collection per panel instead of one artist per grain size
+    for cax, xvals, yvals in line_panels:
+        # (n_sizes, n_waves, 2) array of the (x, y) points of all the lines
+        segments = np.empty((DG.n_sizes, len(xvals), 2))
+        segments[:, :, 0] = xvals
+        segments[:, :, 1] = yvals
+        cax.add_collection(LineCollection(segments, colors=colors))
+    for cax, xvals, yvals in [
+        (ax[1, 0], DG.wavelengths_scat_a, albedo),
+        (ax[1, 1], DG.wavelengths_scat_g, DG.scat_g),
+    ]:
+        cax.scatter(
+            np.tile(xvals, DG.n_sizes),
+            yvals.ravel(),
+            c=np.repeat(colors, len(xvals), axis=0),
         )
 
-        emission = DG.interpol_emission(ISRF)
-
-        ax[1, 2].plot(
-            DG.wavelengths_emission[ews_indxs],
-            emission[i, ews_indxs],
-            color=pcolor,
-        )
-        ax[1, 2].set_xlabel(r"$\lambda$ [$\mu m$]")
-        ax[1, 2].set_ylabel("Emission")
-        ax[1, 2].set_xscale("log")
-        ax[1, 2].set_yscale("log")
-        ax[1, 2].set_ylim([1e-23, 1e-0])
+    # configure the axes once all the grain sizes are plotted
+    for cax in ax.flat:
+        cax.set_xlabel(r"$\lambda$ [$\mu m$]")
+        cax.set_xscale("log")
+    for cax, ylabel in zip(ax.flat, ylabels):
+        cax.set_ylabel(ylabel)
+    for cax in [ax[0, 0], ax[0, 1], ax[0, 2], ax[1, 2]]:
+        cax.set_yscale("log")
+    for cax in [ax[1, 0], ax[1, 1]]:
+        cax.xaxis.set_minor_locator(LogLocator(base=10.0, subs=[2.0, 4.0], numticks=10))
+    for cax in ax.flat:
+        cax.autoscale_view()
+    ax[1, 2].set_ylim([1e-23, 1e-0])
 
     ax[0, 1].set_title(composition)
 
@@ -158,18 +147,15 @@ def plot(DG, composition, ISRF, png=False, eps=False, pdf=False):
     sm.set_array([])
     cbar = fig.colorbar(sm, ax=ax, fraction=0.05, pad=0.04, aspect=50)
     cbar.set_label(r"Grainsizes [$\mu m$]")
-    fig.subplots_adjust(wspace=0.25, right=0.85)
+    # leave room for the colorbars of the images
+    if mesh:
+        fig.subplots_adjust(wspace=0.45, right=0.82)
+    else:
+        fig.subplots_adjust(wspace=0.25, right=0.85)
 
-    # show or save
+    # show or save, in all the requested formats
     basename = "DustGrains_diag_%s" % (composition)
-    if png:
-        fig.savefig(basename + ".png")
-    elif eps:
-        fig.savefig(basename + ".eps")
-    elif pdf:
-        fig.savefig(basename + ".pdf")
-    else:
-        plt.show()
+    save_or_show(fig, basename, png, eps, pdf)
 
 
 if __name__ == "__main__":
@@ -12,9 +12,10 @@ from dgfit.obsdata import ObsData
 def get_krange(x, logaxis=False, in_range=[0]):
     prange = np.array([0.0, 0.0])
     if logaxis:
+        # only positive values, without making a copy of them
         gindxs = x > 0
-        min_x = np.amin(x[gindxs])
-        max_x = np.amax(x[gindxs])
+        min_x = np.amin(x, where=gindxs, initial=np.inf)
+        max_x = np.amax(x, where=gindxs, initial=-np.inf)
     else:
         min_x = np.amin(x)
         max_x = np.amax(x)
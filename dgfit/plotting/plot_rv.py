@@ -1,78 +1,35 @@
-import argparse
-import importlib.resources as importlib_resources
-
-import matplotlib.pyplot as plt
 import matplotlib
 import numpy as np
 from matplotlib.cm import ScalarMappable
 from matplotlib.cm import get_cmap
 from matplotlib.colors import LogNorm
 
-from dgfit.obsdata import ObsData
-from dgfit.dustgrains import DustGrains
+from dgfit.dustgrains import interp_weights, linear_interp
+from dgfit.plotting.helpers import (
+    grain_parser,
+    load_grains,
+    save_or_show,
+    select_backend,
+    sorted_cross_sections,
+)
 
 
 def main():
     # commandline parser
-    parser = argparse.ArgumentParser()
+    parser = grain_parser()
     parser.add_argument(
         "--wave", default=0.1, type=float, help="lamda in A(lambda)/A(V)"
     )
-    parser.add_argument(
-        "-c",
-        "--composition",
-        choices=[
-            "astro-silicates",
-            "astro-carbonaceous",
-            "astro-graphite",
-            "PAH-Z04",
-            "Graphite-Z04",
-            "Silicates-Z04",
-            "ACH2-Z04",
-            "Silicates1-Z04",
-            "Silicates2-Z04",
-            "Carbonaceous-HD23",
-            "AstroDust-HD23",
-            "a-C-Themis",
-            "a-C:H-Themis",
-            "aSil-2-Themis",
-        ],
-        default="astro-silicates",
-        help="Grain composition",
-    )
-    parser.add_argument(
-        "--obsdata",
-        type=str,
-        default="none",
-        help="transform to observed data grids, with the name of the observed data file as input",
-    )
-    parser.add_argument(
-        "--everynth", type=int, default=1, help="Use every nth grain size"
-    )
-    parser.add_argument("--png", help="save figure as a png file", action="store_true")
-    parser.add_argument("--eps", help="save figure as an eps file", action="store_true")
-    parser.add_argument("--pdf", help="save figure as a pdf file", action="store_true")
     args = parser.parse_args()
+    select_backend(args)
 
-    DG = DustGrains()
-    ref = importlib_resources.files("dgfit") / "data"
-    with importlib_resources.as_file(ref) as data_path:
-        DG.from_files(
-            args.composition,
-            path=str(data_path) + "/indiv_grain/",
-            every_nth=args.everynth,
-        )
-
-    if args.obsdata != "none":
-        OD = ObsData(args.obsdata)
-        new_DG = DustGrains()
-        new_DG.from_object(DG, OD)
-        DG = new_DG
-
-    plot(DG, args.wave, args.composition, args.pdf, args.png, args.eps)
+    for composition, DG, _ in load_grains(args):
+        plot(DG, args.wave, composition, args.pdf, args.png, args.eps)
 
 
 def plot(DG, wave, composition, pdf=False, png=False, eps=False):
+    # imported here so that main can select the backend first
+    import matplotlib.pyplot as plt
 
     # setup the plots
     fontsize = 12
@@ -85,24 +42,23 @@ def plot(DG, wave, composition, pdf=False, png=False, eps=False):
     matplotlib.rc("xtick.major", width=2)
     matplotlib.rc("ytick.major", width=2)
 
-    ws_indxs = np.argsort(DG.wavelengths)
-    waves = DG.wavelengths[ws_indxs]
+    waves, _, _, cext = sorted_cross_sections(DG)
 
     fig, ax = plt.subplots(figsize=(8, 6))
 
     num_segments = DG.n_sizes
-    DG.sizes *= 10**4
+    # display copy in micron, DG itself is left unchanged
+    sizes_um = DG.sizes * 1e4
     cmap = get_cmap("hsv", num_segments)
-    norm = LogNorm(vmin=min(DG.sizes), vmax=max(DG.sizes))
-    colors = [cmap(i) for i in range(num_segments)]
-    for i in range(DG.n_sizes):
-        pcolor = colors[i]
-
-        # get the values at specified lambda and V
-        al = np.interp([wave, 0.55, 0.45], waves, DG.cext[i, ws_indxs])
+    norm = LogNorm(vmin=sizes_um.min(), vmax=sizes_um.max())
+    colors = cmap(np.arange(num_segments))
 
-        rv = al[1] / (al[2] - al[1])
-        ax.plot(rv, al[0] / al[1], "o", color=pcolor)
+    # get the values at specified lambda and V for all the grain sizes at once
+    #   outside of the wavelength grid, the values at the ends are used
+    rv_waves = np.clip([wave, 0.55, 0.45], waves[0], waves[-1])
+    al = linear_interp(cext, interp_weights(rv_waves, waves))
+    rv = al[:, 1] / (al[:, 2] - al[:, 1])
+    ax.scatter(rv, al[:, 0] / al[:, 1], c=colors)
 
     sm = ScalarMappable(norm=norm, cmap=cmap)
     sm.set_array([])
@@ -117,16 +73,9 @@ def plot(DG, wave, composition, pdf=False, png=False, eps=False):
 
     plt.tight_layout()
 
-    # show or save
+    # show or save, in all the requested formats
     basename = "DustGrains_diag_%s" % (composition)
-    if png:
-        plt.savefig(basename + ".png")
-    elif eps:
-        plt.savefig(basename + ".eps")
-    elif pdf:
-        plt.savefig(basename + ".pdf")
-    else:
-        plt.show()
+    save_or_show(fig, basename, png, eps, pdf)
 
 
 if __name__ == "__main__":
@@ -1,91 +1,44 @@
-import argparse
-import importlib.resources as importlib_resources
-
-import matplotlib.pyplot as plt
 import matplotlib
 import numpy as np
 
-from dgfit.obsdata import ObsData
-from dgfit.dustgrains import DustGrains
+from dgfit.plotting.helpers import (
+    grain_parser,
+    load_grains,
+    save_or_show,
+    select_backend,
+    sorted_cross_sections,
+    sorted_emission,
+)
 
 
 def main():
     # commandline parser
-    parser = argparse.ArgumentParser()
+    parser = grain_parser()
     parser.add_argument(
         "--wave", default=0.1, type=float, help="lambda in A(lambda)/A(V)"
     )
-    parser.add_argument(
-        "-c",
-        "--composition",
-        choices=[
-            "astro-silicates",
-            "astro-carbonaceous",
-            "astro-PAH",
-            "astro-carbonaceous",
-            "PAH-Z04",
-            "Graphite-Z04",
-            "Silicates-Z04",
-            "ACH2-Z04",
-            "Silicates1-Z04",
-            "Silicates2-Z04",
-            "Carbonaceous-HD23",
-            "AstroDust-HD23",
-            "a-C-Themis",
-            "a-C:H-Themis",
-            "aSil-2-Themis",
-        ],
-        default="astro-silicates",
-        help="Grain composition",
-    )
-    parser.add_argument(
-        "--obsdata",
-        type=str,
-        default="none",
-        help="transform to observed data grids, with the name of the observed data file as input",
-    )
-    parser.add_argument(
-        "--everynth", type=int, default=1, help="Use every nth grain size"
-    )
     parser.add_argument(
         "--ISRF", default=1.0, type=float, help="Choose an ISRF strength"
     )
-    parser.add_argument("--png", help="save figure as a png file", action="store_true")
-    parser.add_argument("--eps", help="save figure as an eps file", action="store_true")
-    parser.add_argument("--pdf", help="save figure as a pdf file", action="store_true")
     args = parser.parse_args()
-
-    DG = DustGrains()
-    ref = importlib_resources.files("dgfit") / "data"
-    with importlib_resources.as_file(ref) as data_path:
-        DG.from_files(
-            args.composition,
-            path=str(data_path) + "/indiv_grain/",
-            every_nth=args.everynth,
+    select_backend(args)
+
+    for composition, DG, OD in load_grains(args):
+        plot(
+            DG,
+            args.wave,
+            composition,
+            args.ISRF,
+            OD,
+            args.png,
+            args.eps,
+            args.pdf,
         )
 
-    if args.obsdata != "none":
-        OD = ObsData(args.obsdata)
-        new_DG = DustGrains()
-        new_DG.from_object(DG, OD)
-        DG = new_DG
-
-    else:
-        OD = "none"
-
-    plot(
-        DG,
-        args.wave,
-        args.composition,
-        args.ISRF,
-        OD,
-        args.png,
-        args.eps,
-        args.pdf,
-    )
-
 
 def plot(DG, wave, composition, ISRF, obsdata="none", png=False, eps=False, pdf=False):
+    # imported here so that main can select the backend first
+    import matplotlib.pyplot as plt
 
     # setup the plots
     fontsize = 12
@@ -99,26 +52,25 @@ def plot(DG, wave, composition, ISRF, obsdata="none", png=False, eps=False, pdf=
 
     fig, ax = plt.subplots(ncols=2, nrows=2, figsize=(15, 10))
 
-    ws_indxs = np.argsort(DG.wavelengths)
-    waves = DG.wavelengths[ws_indxs]
-    ws_indxs_em = np.argsort(DG.wavelengths_emission)
-    waves_em = DG.wavelengths_emission[ws_indxs_em]
-    interpolated_emission = DG.interpol_emission(ISRF)
+    # sort the cross sections once, the rows are then contiguous slices
+    waves, cabs, csca, cext = sorted_cross_sections(DG)
+    waves_em, interpolated_emission = sorted_emission(DG, ISRF)
+    sizes_um = DG.sizes * 1e4
     for i in range(DG.n_sizes):
 
         # get the values at specified lambda and V
-        al = np.interp([wave, 0.55, 0.45], waves, DG.cext[i, ws_indxs])
-        em = np.interp(wave, waves_em, interpolated_emission[i, ws_indxs_em])
+        al = np.interp([wave, 0.55, 0.45], waves, cext[i])
+        em = np.interp(wave, waves_em, interpolated_emission[i])
         if obsdata != "none":
             em /= obsdata.avnhi
-        absext = DG.cabs[i, ws_indxs] / DG.cext[i, ws_indxs]
-        scaext = DG.csca[i, ws_indxs] / DG.cext[i, ws_indxs]
-        cabs = np.interp(wave, waves, absext)
-        csca = np.interp(wave, waves, scaext)
-        ax[0][0].plot(DG.sizes[i] * 1e4, al[0] / al[1], "o", color="b")
-        ax[0][1].plot(DG.sizes[i] * 1e4, em, "o", color="b")
-        ax[1][0].plot(DG.sizes[i] * 1e4, cabs, "o", color="b")
-        ax[1][1].plot(DG.sizes[i] * 1e4, csca, "o", color="b")
+        absext = cabs[i] / cext[i]
+        scaext = csca[i] / cext[i]
+        abs_ratio = np.interp(wave, waves, absext)
+        sca_ratio = np.interp(wave, waves, scaext)
+        ax[0][0].plot(sizes_um[i], al[0] / al[1], "o", color="b")
+        ax[0][1].plot(sizes_um[i], em, "o", color="b")
+        ax[1][0].plot(sizes_um[i], abs_ratio, "o", color="b")
+        ax[1][1].plot(sizes_um[i], sca_ratio, "o", color="b")
 
     ax[0][0].set_xlabel(r"$a$ [$\mu m$]")
     ax[0][0].set_ylabel(f"A({wave})/A(V)")
@@ -145,16 +97,9 @@ def plot(DG, wave, composition, ISRF, obsdata="none", png=False, eps=False, pdf=
 
     plt.tight_layout()
 
-    # show or save
+    # show or save, in all the requested formats
     basename = "DustGrains_diag_%s" % (composition)
-    if png:
-        fig.savefig(basename + ".png")
-    elif eps:
-        fig.savefig(basename + ".eps")
-    elif pdf:
-        fig.savefig(basename + ".pdf")
-    else:
-        plt.show()
+    save_or_show(fig, basename, png, eps, pdf)
 
 
 if __name__ == "__main__":
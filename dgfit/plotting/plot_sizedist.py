@@ -10,9 +10,10 @@ from astropy.io import fits
 def get_krange(x, logaxis=False, in_range=[0]):
     prange = np.array([0.0, 0.0])
     if logaxis:
+        # only positive values, without making a copy of them
         gindxs = x > 0
-        min_x = np.amin(x[gindxs])
-        max_x = np.amax(x[gindxs])
+        min_x = np.amin(x, where=gindxs, initial=np.inf)
+        max_x = np.amax(x, where=gindxs, initial=-np.inf)
     else:
         min_x = np.amin(x)
         max_x = np.amax(x)
@@ -55,12 +56,12 @@ def plot(
     else:
         plot_uncs = False
 
-    yrange = [0]
     all_yvals = []
     for i in range(hdulist[0].header["NCOMPS"]):
         hdu = hdulist[i + 1]
 
-        xvals = hdu.data["SIZE"] * 1e4
+        sizes = hdu.data["SIZE"]
+        xvals = sizes * 1e4
         yvals = hdu.data["DIST"]
 
         if np.sum(yvals) == 0:
@@ -72,24 +73,21 @@ def plot(
             yvals_munc = hdu.data["DISTMUNC"]
 
         if multa4:
-            xvals4 = hdu.data["SIZE"] ** 4
+            # multiplies instead of the slower general power
+            sizes2 = sizes * sizes
+            xvals4 = sizes2 * sizes2
             yvals *= xvals4
             if plot_uncs:
                 yvals_punc *= xvals4
                 yvals_munc *= xvals4
 
         elif mass:
-            xvals3 = hdu.data["SIZE"] ** 3
+            xvals3 = sizes * sizes * sizes
             yvals *= xvals3
             if plot_uncs:
                 yvals_punc *= xvals3
                 yvals_munc *= xvals3
 
-        yrange = get_krange(yvals, logaxis=True, in_range=yrange)
-        if plot_uncs:
-            yrange = get_krange(yvals - yvals_munc, logaxis=True, in_range=yrange)
-            yrange = get_krange(yvals + yvals_punc, logaxis=True, in_range=yrange)
-
         gindxs = yvals > 0
         all_yvals.append(np.max(yvals))
 
@@ -1,14 +1,14 @@
+import contextlib
 import importlib.resources as importlib_resources
 import time
 import argparse
+import warnings
 
-import matplotlib.pyplot as plt
 import numpy as np
 
 from scipy.optimize import minimize
 import emcee
 from multiprocessing import Pool
-import corner
 
 from dgfit.dustmodel import (
     DustModel,
@@ -20,6 +20,41 @@ from dgfit.dustmodel import (
 )
 from dgfit.obsdata import ObsData
 
+# optional (dgfit[parallel]), used to limit the number of BLAS threads
+#   per process
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+
+def limit_blas_threads(n_threads):
+    """
+    Limit the number of threads used by the BLAS library of numpy.
+    Only done if threadpoolctl is installed, main warns once if it is not.
+
+    Parameters
+    ----------
+    n_threads : int
+        maximum number of threads
+
+    Returns
+    -------
+    context manager
+        restores the original limits on exit
+    """
+    if threadpool_limits is None:
+        return contextlib.nullcontext()
+    return threadpool_limits(limits=n_threads)
+
+
+def init_pool_worker():
+    """
+    One BLAS thread for each pool worker as the MCMC parallelizes over
+    the processes, avoids oversubscribing the cpus.
+    """
+    limit_blas_threads(1)
+
 
 def DGFit_cmdparser():
     # commandline parser
@@ -117,7 +152,7 @@ def DGFit_cmdparser():
         "-t", "--tag", default="dgfit_test", help="basename to use for output files"
     )
     parser.add_argument(
-        "-c", "--cpus", metavar=int, default=4, help="number of cpus to use"
+        "-c", "--cpus", type=int, default=4, help="number of cpus to use"
     )
     parser.add_argument(
         "--nolarge", action="store_true", help="Deweight a > 0.5 micron by 1e-10"
@@ -170,26 +205,76 @@ def set_grains_for_fitting(names):
 
 def calc_sizedist_fact(dustmodel, obsdata):
 
-    results = dustmodel.eff_grain_props(obsdata)
-    natoms = results["natoms"]
-    factor_C = 1
-    factor_sil = 1
-    for atomname in natoms.keys():
-        if natoms[atomname] > (
-            obsdata.abundance_av[atomname][0] + obsdata.abundance_av[atomname][1]
-        ):
-            if atomname == "C":
-                newfactor_C = natoms[atomname] / obsdata.abundance_av[atomname][0]
-                if newfactor_C > factor_C:
-                    factor_C = newfactor_C
-            else:
-                newfactor_sil = natoms[atomname] / obsdata.abundance_av[atomname][0]
-                if newfactor_sil > factor_sil:
-                    factor_sil = newfactor_sil
+    # number of atoms is linear in the size distributions
+    natoms = dustmodel.compute_natoms_basis() @ dustmodel.size_dists
+
+    indxs = [obsdata.abundance_av_indxs[aname] for aname in dustmodel.atom_names]
+    abund = obsdata.abundance_av_vals[indxs]
+    abund_unc = obsdata.abundance_av_uncs[indxs]
+
+    # factors needed to bring the atoms above the abundances back to them
+    factors = np.where(natoms > (abund + abund_unc), natoms / abund, 1.0)
+    carbon = np.array(dustmodel.atom_names) == "C"
+    factor_C = np.max(factors[carbon], initial=1.0)
+    factor_sil = np.max(factors[~carbon], initial=1.0)
 
     return factor_C, factor_sil
 
 
+def minimize_bins(dustmodel, obsdata, p0, maxiter=1000, step=1e-8, gtol=1e-12):
+    """
+    Find the best fit for the bins size distribution with a bounded
+    quasi-Newton minimizer.  The parameters are scaled by the starting
+    values as they span many orders of magnitude and the finite difference
+    gradient is computed for all the parameters with one batch call.
+    The parameters are kept strictly positive so that the MCMC walkers
+    can be started around the solution in log space.
+
+    Parameters
+    ----------
+    dustmodel : DustModel object
+        dust model with the bins size distribution
+    obsdata : ObsData object
+        observed data to be fit
+    p0 : floats
+        starting parameters
+    maxiter : int, optional
+        maximum number of minimizer iterations
+    step : float, optional
+        finite difference step for the gradient in the scaled parameters,
+        i.e., relative to the starting values
+    gtol : float, optional
+        projected gradient tolerance of the minimizer, small as -lnprob
+        is large and its gradient in the scaled parameters can be small
+        while still far from the minimum
+
+    Returns
+    -------
+    OptimizeResult
+        minimizer results with x in the original parameter units,
+        all the parameters are at least 1e-10 times the starting values
+        (1e-10 for starting values that are not positive)
+    """
+    scale = np.where(p0 > 0.0, p0, 1.0)
+    ndim = len(p0)
+
+    def nll_grad(x):
+        params = np.vstack([x, x + step * np.identity(ndim)]) * scale
+        nll = -dustmodel.lnprob_batch(params, obsdata, dustmodel)
+        return nll[0], (nll[1:] - nll[0]) / step
+
+    soln = minimize(
+        nll_grad,
+        np.ones(ndim),
+        jac=True,
+        method="L-BFGS-B",
+        bounds=[(1e-10, None)] * ndim,
+        options={"maxiter": maxiter, "gtol": gtol},
+    )
+    soln.x *= scale
+    return soln
+
+
 def setparams_MRN(dustmodel, obsdata, factor_C, factor_sil, ISRF):
 
     pnames = []
@@ -439,7 +524,7 @@ def main():
     basename = f"{args.tag}_{args.sizedisttype}"
 
     # save the start time
-    start_time = time.process_time()
+    start_time = time.perf_counter()
 
     # emcee parameters
     if args.fast:
@@ -451,7 +536,7 @@ def main():
         nsteps = 10000
         burnfrac = 0.2
     else:
-        burnfrac = int(args.burnfrac)
+        burnfrac = args.burnfrac
         nsteps = int(args.nsteps)
 
     # get the location of the provided data
@@ -589,9 +674,7 @@ def main():
             # if not, adjust the overall level of the size distributions to
             #     get them close
             results = dustmodel.eff_grain_props(obsdata)
-            cabs = results["cabs"]
-            csca = results["csca"]
-            dust_alav = 1.086 * (cabs + csca)
+            dust_alav = dustmodel.ext_alav(results["cabs"], results["csca"])
             ave_model = np.average(dust_alav)
             ave_data = np.average(obsdata.ext_alav)
             ave_ratio = ave_data / ave_model
@@ -634,7 +717,7 @@ def main():
     dustmodel.save_results(basename + "_sizedist_start.fits", obsdata)
 
     # setup time
-    setup_time = time.process_time()
+    setup_time = time.perf_counter()
     print("setup time taken: ", (setup_time - start_time) / 60.0, " min")
 
     call_count = {"n": 0}
@@ -648,21 +731,25 @@ def main():
             )  # added this line to check when the minimizer converges
         return -dustmodel.lnprob(*args)
 
-    soln = minimize(
-        nll,
-        p0,
-        args=(obsdata, dustmodel),
-        method="Nelder-Mead",
-        options={"maxiter": 10000, "maxfev": 10000, "disp": True},
-    )
+    if sizedisttype == "bins":
+        soln = minimize_bins(dustmodel, obsdata, np.asarray(p0))
+    else:
+        soln = minimize(
+            nll,
+            p0,
+            args=(obsdata, dustmodel),
+            method="Nelder-Mead",
+            options={"maxiter": 10000, "maxfev": 10000, "disp": True},
+        )
     opt_params = soln.x
+    dustmodel.set_size_dist(opt_params)
     dustmodel.set_size_dist_parameters(opt_params)
 
     oname = f"{basename}_sizedist_best_optimizer.fits"
     # TODO: add saving of the size distribution parameters for the analytic forms
     dustmodel.save_results(oname, obsdata)
 
-    opt_time = time.process_time()
+    opt_time = time.perf_counter()
     print("optimizer time taken: ", (opt_time - setup_time) / 60.0, " min")
 
     if args.mcmc:
@@ -685,21 +772,53 @@ def main():
         backend = emcee.backends.HDFBackend(emcee_samples_file)
         backend.reset(nwalkers, ndim)
 
+        # differential evolution moves mix faster than the default stretch
+        #    move for the many correlated parameters of the size distributions
+        moves = [
+            (emcee.moves.DEMove(), 0.8),
+            (emcee.moves.DESnookerMove(), 0.2),
+        ]
+
         # setup the sampler
-        with Pool() as pool:
+        if threadpool_limits is None:
+            warnings.warn(
+                "threadpoolctl is not installed, the number of BLAS threads is "
+                "not limited and the MCMC may oversubscribe the cpus "
+                "(install with pip install dgfit[parallel])"
+            )
+        if sizedisttype == "bins":
+            # bins model is linear in the parameters
+            #    so all the walkers can be computed at once
+            #    the matrix products are threaded by BLAS, up to the requested cpus
             sampler = emcee.EnsembleSampler(
                 nwalkers,
                 ndim,
-                dustmodel.lnprob,
+                dustmodel.lnprob_batch,
                 args=(obsdata, dustmodel),
-                pool=pool,
+                vectorize=True,
                 backend=backend,
+                moves=moves,
             )
 
             # do the sampling
-            sampler.run_mcmc(p, nsteps, progress=True)
-
-        emcee_time = time.process_time()
+            with limit_blas_threads(args.cpus):
+                sampler.run_mcmc(p, nsteps, progress=True)
+        else:
+            with Pool(processes=args.cpus, initializer=init_pool_worker) as pool:
+                sampler = emcee.EnsembleSampler(
+                    nwalkers,
+                    ndim,
+                    dustmodel.lnprob,
+                    args=(obsdata, dustmodel),
+                    pool=pool,
+                    backend=backend,
+                    moves=moves,
+                )
+
+                # do the sampling
+                sampler.run_mcmc(p, nsteps, progress=True)
+
+        emcee_time = time.perf_counter()
         print("emcee time taken: ", (emcee_time - opt_time) / 60.0, " min")
 
         # best fit dust params
@@ -713,6 +832,10 @@ def main():
         )
 
         if ndim < 30:
+            # plotting only imported when needed
+            #    keeps them out of the imports done by spawned pool workers
+            import matplotlib.pyplot as plt
+            import corner
 
             # plot the walker chains for all parameters
             nwalkers, nsteps, ndim = sampler.chain.shape
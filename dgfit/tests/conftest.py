@@ -0,0 +1,48 @@
+import importlib.resources as importlib_resources
+
+import numpy as np
+import pytest
+
+from dgfit.dustmodel import DustModel
+from dgfit.obsdata import ObsData
+
+
+@pytest.fixture(scope="session")
+def data_path():
+    """
+    Directory with the package data.
+    """
+    ref = importlib_resources.files("dgfit") / "data"
+    with importlib_resources.as_file(ref) as path:
+        yield str(path)
+
+
+@pytest.fixture(scope="session")
+def obsdata(data_path):
+    """
+    Observed data of the mw_rv31 sightline.
+    """
+    return ObsData("mw_rv31_obs.dat", path=data_path + "/mw_rv31/")
+
+
+@pytest.fixture
+def dustmodel(data_path, obsdata):
+    """
+    Astro silicates and carbonaceous grains (every 10th size) on the
+    observed data grids, made for each test as the tests change it.
+    """
+    dmod_full = DustModel(
+        componentnames=["astro-silicates", "astro-carbonaceous"],
+        path=data_path + "/indiv_grain/",
+        every_nth=10,
+    )
+    return DustModel(dustmodel=dmod_full, obsdata=obsdata)
+
+
+@pytest.fixture
+def p0(dustmodel):
+    """
+    Bins parameters of the dustmodel, its size distributions and a unit
+    radiation field strength.
+    """
+    return np.concatenate([dustmodel.size_dists, [1.0]])
@@ -0,0 +1,82 @@
+import os
+import shutil
+
+import numpy as np
+
+from dgfit.dustgrains import (
+    DustGrains,
+    build_grain_cache,
+    grain_filelist,
+    load_grain_tables,
+)
+
+componentname = "aSil-2-Themis"
+prop_names = [
+    "sizes",
+    "size_dist",
+    "wavelengths",
+    "cext",
+    "cabs",
+    "csca",
+    "wavelengths_scat_g",
+    "scat_g",
+    "wavelengths_emission",
+    "emission",
+    "ISRF_field_strengths",
+    "stochastic_heating",
+]
+
+
+def copy_grain_files(data_path, tmp_path):
+    # only the files of one component so the cache can be made
+    for filename, _ in grain_filelist(componentname, data_path + "/indiv_grain/"):
+        shutil.copy2(filename, tmp_path)
+    return str(tmp_path) + "/"
+
+
+def read_grains(path, every_nth):
+    # not from the tables of a previous test with the same path
+    load_grain_tables.cache_clear()
+    DG = DustGrains()
+    DG.from_files(componentname, path=path, every_nth=every_nth)
+    return DG
+
+
+def test_grain_cache(data_path, tmp_path):
+    path = copy_grain_files(data_path, tmp_path)
+
+    for every_nth in [1, 3]:
+        DG_ascii = read_grains(path, every_nth)
+        cachename = build_grain_cache(componentname, path=path)
+        assert os.path.isfile(cachename)
+        DG_cache = read_grains(path, every_nth)
+        os.remove(cachename)
+
+        for name in prop_names:
+            np.testing.assert_array_equal(
+                getattr(DG_cache, name), getattr(DG_ascii, name)
+            )
+        assert DG_cache.n_sizes == DG_ascii.n_sizes
+
+
+def test_grain_cache_stale(data_path, tmp_path):
+    path = copy_grain_files(data_path, tmp_path)
+    DG_ascii = read_grains(path, 1)
+
+    # modified cache to tell which one is read
+    cachename = build_grain_cache(componentname, path=path)
+    with np.load(cachename) as data:
+        tables = {name: data[name] for name in data.files}
+    tables["cabs"] = 2.0 * tables["cabs"]
+    np.savez(cachename, **tables)
+    np.testing.assert_array_equal(read_grains(path, 1).cabs, 2.0 * DG_ascii.cabs)
+
+    # an ASCII file newer than the cache
+    filename = grain_filelist(componentname, path)[0][0]
+    cache_time = os.path.getmtime(cachename)
+    os.utime(filename, (cache_time + 10.0, cache_time + 10.0))
+    np.testing.assert_array_equal(read_grains(path, 1).cabs, DG_ascii.cabs)
+
+    # no cache
+    os.remove(cachename)
+    np.testing.assert_array_equal(read_grains(path, 1).cabs, DG_ascii.cabs)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from dgfit.dustgrains import interp_weights, linear_interp
+
+xp = np.array([0.1, 0.3, 1.0, 2.5, 10.0])
+# two rows of values, interpolated along the last axis
+fp = np.array([np.log(xp), xp**2])
+
+
+@pytest.mark.parametrize(
+    "x",
+    [
+        np.array([0.2, 0.7, 3.0, 9.9]),  # in range
+        xp[1:-1],  # interior nodes
+        np.array([xp[0], xp[-1]]),  # endpoints
+        np.array([xp[-1], 0.5, xp[0], 0.5]),  # unsorted with repeats
+    ],
+)
+def test_linear_interp(x):
+    vals = linear_interp(fp, interp_weights(x, xp))
+    assert vals.shape == (2, len(x))
+    for k in range(len(fp)):
+        np.testing.assert_allclose(vals[k], np.interp(x, xp, fp[k]), rtol=1e-14)
+
+
+def test_linear_interp_nodes_exact():
+    vals = linear_interp(fp, interp_weights(xp, xp))
+    np.testing.assert_array_equal(vals, fp)
+
+
+@pytest.mark.parametrize("x", [[0.05], [10.5], [0.2, 11.0], [-1.0, 0.5]])
+def test_interp_weights_out_of_range(x):
+    with pytest.raises(ValueError):
+        interp_weights(x, xp)
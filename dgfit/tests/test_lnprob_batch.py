@@ -0,0 +1,12 @@
+import numpy as np
+
+from dgfit.dustmodel import DustModel
+
+
+def test_lnprob_batch(obsdata, dustmodel, p0):
+    rng = np.random.default_rng(1234)
+    params = p0 * (1.0 + 0.1 * rng.standard_normal((5, len(p0))))
+    params[:, -1] = [0.3, 1.0, 1.5, 7.0, 20.0]
+
+    lnps = [DustModel.lnprob(cparams.copy(), obsdata, dustmodel) for cparams in params]
+    np.testing.assert_allclose(DustModel.lnprob_batch(params, obsdata, dustmodel), lnps)
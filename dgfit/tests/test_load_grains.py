@@ -0,0 +1,55 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from dgfit.dustgrains import DustGrains, grain_filelist
+from dgfit.plotting.helpers import grain_parser, load_grains
+
+compnames = ["aSil-2-Themis", "a-C:H-Themis"]
+
+
+def test_load_grains(data_path):
+    args = grain_parser().parse_args(["-c"] + compnames + ["--everynth", "2"])
+
+    n_grains = 0
+    for composition, DG, OD in load_grains(args):
+        assert composition == compnames[n_grains]
+        assert OD == "none"
+        DG_ref = DustGrains()
+        DG_ref.from_files(composition, path=data_path + "/indiv_grain/", every_nth=2)
+        np.testing.assert_array_equal(DG.sizes, DG_ref.sizes)
+        np.testing.assert_array_equal(DG.cext, DG_ref.cext)
+        n_grains += 1
+    assert n_grains == len(compnames)
+
+
+def test_load_grains_obsdata(data_path, obsdata, monkeypatch):
+    # observed data file given relative to the working directory
+    monkeypatch.chdir(data_path + "/mw_rv31/")
+    args = grain_parser().parse_args(
+        ["-c"] + compnames + ["--obsdata", "mw_rv31_obs.dat"]
+    )
+    grains = list(load_grains(args))
+
+    assert [grain[0] for grain in grains] == compnames
+    for composition, DG, OD in grains:
+        # observed data read once for all the compositions
+        assert OD is grains[0][2]
+        np.testing.assert_array_equal(DG.wavelengths, obsdata.ext_waves)
+
+
+def test_load_grains_lazy(data_path, tmp_path, monkeypatch):
+    # data directory with the files of the first composition only
+    (tmp_path / "indiv_grain").mkdir()
+    for filename, _ in grain_filelist(compnames[0], data_path + "/indiv_grain/"):
+        shutil.copy(filename, tmp_path / "indiv_grain")
+    monkeypatch.setenv("DGFIT_DATA_PATH", str(tmp_path))
+
+    # each composition is only read when reached
+    args = grain_parser().parse_args(["-c"] + compnames)
+    grains = load_grains(args)
+    composition, DG, _ = next(grains)
+    assert composition == compnames[0]
+    with pytest.raises(FileNotFoundError):
+        next(grains)
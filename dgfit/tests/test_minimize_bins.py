@@ -0,0 +1,23 @@
+import numpy as np
+
+from dgfit.dustmodel import DustModel
+from dgfit.run_dgfit import minimize_bins
+
+
+def test_minimize_bins(obsdata, dustmodel, p0):
+    nll_p0 = -DustModel.lnprob(p0.copy(), obsdata, dustmodel)
+
+    soln = minimize_bins(dustmodel, obsdata, p0, maxiter=20)
+
+    # improved on the starting parameters
+    assert soln.fun < nll_p0
+    np.testing.assert_allclose(
+        -DustModel.lnprob(soln.x.copy(), obsdata, dustmodel), soln.fun, rtol=1e-10
+    )
+    # kept within the bounds
+    assert np.all(soln.x >= 1e-10 * p0 * (1.0 - 1e-12))
+
+    # a looser tolerance stops earlier, still improving on the start
+    soln_loose = minimize_bins(dustmodel, obsdata, p0, maxiter=20, gtol=1e-2)
+    assert soln_loose.nit < soln.nit
+    assert nll_p0 > soln_loose.fun > soln.fun
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from dgfit.dustgrains import DustGrains
+
+
+def ref_natoms(DG, size_dist):
+    # reference loop over the atoms and the size intervals
+    #   trapezoidal integration of the grain volumes
+    natoms = np.zeros(len(DG.atomic_comp_names))
+    if DG.name == "a-C:H-Themis":
+        mantle = 5e-7
+        best_index = np.max(np.where(DG.sizes <= mantle)[0]) + 1
+
+    for i in range(len(DG.atomic_comp_names)):
+        for j in range(DG.n_sizes - 1):
+            delta = 0.5 * (DG.sizes[j + 1] - DG.sizes[j])
+            for k in [j, j + 1]:
+                size = DG.sizes[k]
+                if DG.name == "a-C:H-Themis":
+                    if j < best_index - 1:
+                        vol = size**3 * 1.6 / 1.3
+                    elif j == best_index - 1:
+                        # interval between the two regimes not included
+                        vol = 0.0
+                    else:
+                        core = (size - mantle) ** 3
+                        vol = (size**3 - core) * 1.6 / 1.3 + core
+                elif DG.name == "aSil-2-Themis":
+                    core = (size - 2.5e-7) ** 3
+                    if i == 3:
+                        vol = (size**3 - core) * 1.6 / 2.7
+                    else:
+                        vol = core
+                else:
+                    vol = size**3
+                natoms[i] += delta * vol * size_dist[k] * DG.col_den_constant[i]
+    return natoms
+
+
+@pytest.mark.parametrize(
+    "componentname",
+    ["astro-silicates", "astro-carbonaceous", "a-C:H-Themis", "aSil-2-Themis"],
+)
+def test_compute_natoms(componentname, data_path):
+    DG = DustGrains()
+    DG.from_files(componentname, path=data_path + "/indiv_grain/", every_nth=5)
+
+    rng = np.random.default_rng(1234)
+    size_dist = DG.size_dist * rng.uniform(0.5, 2.0, DG.n_sizes)
+    natoms = DG.compute_natoms(size_dist)
+    np.testing.assert_allclose(natoms, ref_natoms(DG, size_dist), rtol=1e-12)
+    # same through the basis used by the models
+    np.testing.assert_allclose(DG.natoms_basis() @ size_dist, natoms, rtol=1e-12)
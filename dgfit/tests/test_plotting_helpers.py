@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+import matplotlib
+import numpy as np
+import pytest
+
+from dgfit.dustgrains import allowed_components
+from dgfit.plotting.helpers import (
+    grain_parser,
+    save_or_show,
+    sort_indices,
+    sorted_cross_sections,
+)
+
+# no GUI backend during the tests
+matplotlib.use("Agg")
+
+
+def test_grain_parser():
+    parser = grain_parser(everynth=5)
+    args = parser.parse_args([])
+    assert args.composition == ["astro-silicates"]
+    assert args.obsdata == "none"
+    assert args.everynth == 5
+    assert not (args.png or args.eps or args.pdf)
+
+    compnames = sorted(allowed_components)[:2]
+    args = parser.parse_args(["-c"] + compnames + ["--everynth", "2", "--png"])
+    assert args.composition == compnames
+    assert args.everynth == 2
+    assert args.png
+
+    with pytest.raises(SystemExit):
+        parser.parse_args(["-c", "not-a-composition"])
+
+
+def test_sort_indices():
+    assert sort_indices(np.array([0.1, 0.2, 0.2, 5.0])) is None
+    vals = np.array([3.0, 0.1, 2.0, 1.0])
+    indxs = sort_indices(vals)
+    np.testing.assert_array_equal(vals[indxs], np.sort(vals))
+
+
+def test_sorted_cross_sections():
+    waves = np.array([0.1, 1.0, 2.0, 3.0])
+    cabs = np.arange(8.0).reshape(2, 4)
+    DG = SimpleNamespace(wavelengths=waves, cabs=cabs, csca=2.0 * cabs, cext=3.0 * cabs)
+
+    # already sorted, the same values
+    sorted_vals = sorted_cross_sections(DG)
+    for vals, ref_vals in zip(sorted_vals, [waves, DG.cabs, DG.csca, DG.cext]):
+        np.testing.assert_array_equal(vals, ref_vals)
+    assert all(vals.flags["C_CONTIGUOUS"] for vals in sorted_vals[1:])
+
+    # unsorted, the wavelengths of all the grain sizes are reordered
+    indxs = np.array([2, 0, 3, 1])
+    DG_unsorted = SimpleNamespace(
+        wavelengths=waves[indxs],
+        cabs=DG.cabs[:, indxs],
+        csca=DG.csca[:, indxs],
+        cext=DG.cext[:, indxs],
+    )
+    sorted_vals = sorted_cross_sections(DG_unsorted)
+    for vals, ref_vals in zip(sorted_vals, [waves, DG.cabs, DG.csca, DG.cext]):
+        np.testing.assert_array_equal(vals, ref_vals)
+
+
+def test_save_or_show(tmp_path, monkeypatch):
+    import matplotlib.pyplot as plt
+
+    shown = []
+    monkeypatch.setattr(plt, "show", lambda: shown.append(True))
+
+    # saved in all the requested formats and closed
+    fig, ax = plt.subplots()
+    basename = str(tmp_path / "test_fig")
+    save_or_show(fig, basename, png=True, pdf=True)
+    assert (tmp_path / "test_fig.png").is_file()
+    assert (tmp_path / "test_fig.pdf").is_file()
+    assert not (tmp_path / "test_fig.eps").is_file()
+    assert not plt.fignum_exists(fig.number)
+    assert not shown
+
+    # shown if no format is requested
+    fig, ax = plt.subplots()
+    save_or_show(fig, basename)
+    assert shown
+    plt.close(fig)
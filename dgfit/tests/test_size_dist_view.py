@@ -0,0 +1,33 @@
+import pickle
+
+import numpy as np
+import pytest
+
+
+def test_size_dist_assign(obsdata, dustmodel):
+    res1 = dustmodel.eff_grain_props(obsdata)
+    new_size_dist = 2.0 * dustmodel.components[0].size_dist
+    dustmodel.components[0].size_dist = new_size_dist
+
+    # still a view into the size distributions of the model
+    np.testing.assert_array_equal(
+        dustmodel.size_dists[dustmodel.size_slices[0]], new_size_dist
+    )
+    res2 = dustmodel.eff_grain_props(obsdata)
+    assert not np.allclose(res1["cabs"], res2["cabs"])
+    np.testing.assert_allclose(
+        res2["cabs"],
+        sum(comp.eff_grain_props(obsdata)["cabs"] for comp in dustmodel.components),
+    )
+
+    # the number of sizes of a component in a model is fixed
+    with pytest.raises(ValueError):
+        dustmodel.components[0].size_dist = new_size_dist[1:]
+
+
+def test_size_dist_pickle(dustmodel):
+    dmod2 = pickle.loads(pickle.dumps(dustmodel))
+    params = np.concatenate([3.0 * dmod2.size_dists, [1.0]])
+    dmod2.set_size_dist(params)
+    for k, component in enumerate(dmod2.components):
+        np.testing.assert_array_equal(component.size_dist, params[dmod2.size_slices[k]])
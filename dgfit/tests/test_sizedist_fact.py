@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from dgfit.dustmodel import DustModel
+from dgfit.run_dgfit import calc_sizedist_fact
+
+
+def ref_sizedist_fact(dustmodel, obsdata):
+    # reference computation summing the atoms of each component
+    natoms = {}
+    for component in dustmodel.components:
+        cnatoms = component.compute_natoms(component.size_dist)
+        for aname, val in zip(component.atomic_comp_names, cnatoms):
+            natoms[aname] = natoms.get(aname, 0.0) + val
+
+    factor_C = 1.0
+    factor_sil = 1.0
+    for aname in natoms.keys():
+        abund, abund_unc = obsdata.abundance_av[aname]
+        if natoms[aname] > (abund + abund_unc):
+            if aname == "C":
+                factor_C = max(factor_C, natoms[aname] / abund)
+            else:
+                factor_sil = max(factor_sil, natoms[aname] / abund)
+    return factor_C, factor_sil
+
+
+@pytest.mark.parametrize(
+    "componentnames",
+    [
+        ["astro-silicates", "astro-carbonaceous"],
+        ["aSil-2-Themis", "a-C-Themis", "a-C:H-Themis"],
+    ],
+)
+def test_calc_sizedist_fact(componentnames, data_path, obsdata):
+    dmod = DustModel(
+        componentnames=componentnames,
+        path=data_path + "/indiv_grain/",
+        every_nth=10,
+    )
+
+    # all above, only carbon above and all below the abundances
+    for scale in [1.0, 5e-8, 1e-4]:
+        dmod.size_dists *= scale
+        np.testing.assert_allclose(
+            calc_sizedist_fact(dmod, obsdata), ref_sizedist_fact(dmod, obsdata)
+        )